@@ -2,20 +2,46 @@
 This module provides functions to create an aesthetic Scalable Vector Graphics avatar.
 """
 
-from bz2 import decompress
-from functools import lru_cache
+from array import array
+from collections import OrderedDict, deque
+from functools import lru_cache, partial, wraps
 from hashlib import blake2b
+from itertools import groupby, islice, repeat
+from os import cpu_count, replace
 from pathlib import Path
-from pickle import loads
 from platform import uname
-from random import choices, shuffle
+import random
+from re import findall
+from struct import pack, unpack_from
+from sys import byteorder
 from tempfile import gettempdir
-from typing import Iterator, NoReturn, Union
+from time import perf_counter
+from typing import AsyncIterator, Iterator, NoReturn, Union
 from xml.etree.ElementTree import fromstring, tostring, ElementTree
 
+try:
+    from zlib import compress, crc32, decompressobj
+except ImportError:  # Stripped Pyodide builds
+    compress = crc32 = decompressobj = None
+try:
+    from mmap import mmap, ACCESS_READ
+except ImportError:  # Calling None raises the TypeError of the read() fallbacks
+    mmap = ACCESS_READ = None
+
+
+@lru_cache(1)
+def _numpy():
+    """
+    NumPy imported at its first use, so that make() alone never pays for it, or None as by default in Pyodide.
+    """
+    try:
+        return __import__("numpy")
+    except ImportError:
+        return None
+
 
 if "emscripten" in getattr(uname(), "system", "").casefold():  # At runtime
-    FILE = (__file__ := "/home/pyodide/") + "final.bz2"
+    FILE = (__file__ := "/home/pyodide/") + "final.bin"
 
     def __rgb_decode(nio: str) -> list:
         """
@@ -29,43 +55,559 @@ if "emscripten" in getattr(uname(), "system", "").casefold():  # At runtime
             for i in range(0, len(k), 15)
         ]
 
-try:
-    p = (Path(__file__).parent / f"{FILE if 'FILE' in globals() else 'final.bz2'}").read_bytes()  # By convenience
-    values, colors = loads(decompress(b"BZh" + p.split(b"BZh")[1])), loads(decompress(b"BZh" + p.split(b"BZh")[2]))  # No sets
-except (FileNotFoundError, OSError, PermissionError, SyntaxError, TypeError, ValueError) as e:
-    raise e from e
+
+
+class Assets:
+    """
+    Compact path sets and palettes, mapped on first use and decoded one record at a time.
+    .. note::
+        Little-endian header of magic, set, palette and string counts, paths per set and colors per palette,
+        then string offsets, one byte per path of each set, 0x00RRGGBB palettes and the path strings blob.
+    """
+
+    MAGIC = b"AVT\x01"
+
+    def __init__(self, file=None):
+        self.file = file
+        self.mem = self.strings = None
+        self.sets = self.palettes = self.paths = self.width = self.index = self.rgb = 0
+
+    def load(self):
+        if self.mem is not None:
+            return self
+        t = PROFILER.enter()
+        try:
+            with open(self.file, "rb") as f:
+                try:
+                    self.mem = memoryview(mmap(f.fileno(), 0, access=ACCESS_READ))
+                except (OSError, TypeError, ValueError):  # Without mmap, as on some Emscripten file systems
+                    self.mem = memoryview(f.read())
+        except (FileNotFoundError, OSError, PermissionError) as e:
+            raise e from e
+        if self.mem[:4] != self.MAGIC:
+            raise Exception(f"{self.file} is not a compact asset file.")
+        self.sets, self.palettes, n, self.paths, self.width = unpack_from("<3I2H", self.mem, 4)
+        offsets = unpack_from(f"<{n + 1}I", self.mem, 20)
+        self.index = 24 + 4 * n
+        self.rgb = self.index + self.sets * self.paths
+        blob = self.rgb + 4 * self.palettes * self.width
+        self.strings = [bytes(self.mem[blob + i:blob + j]).decode() for i, j in zip(offsets, offsets[1:])]
+        PROFILER.leave("assets", t, bytes_in=len(self.mem))
+        return self
+
+    def path_set(self, i: int) -> list:
+        k = self.index + i * self.paths
+        return [self.strings[j] for j in self.mem[k:k + self.paths]]
+
+    def palette(self, i: int) -> list:
+        return [f"#{x:06x}" for x in unpack_from(f"<{self.width}I", self.mem, self.rgb + 4 * i * self.width)]
+
+    @classmethod
+    def convert(cls, src="final.bz2", dst="final.bin") -> str:
+        """
+        Conversion of the legacy pair of bz2-compressed pickles into the compact asset file.
+        :rtype: str
+        """
+        p = Path(src).read_bytes()
+        decompress, loads = __import__("bz2").decompress, __import__("pickle").loads
+        paths, palettes = (loads(decompress(b"BZh" + k)) for k in p.split(b"BZh")[1:3])
+        strings = sorted({d for k in paths for d in k})
+        if len(strings) > 256:
+            raise Exception("More than 256 distinct paths.")
+        lookup, blob, offsets = {d: i for i, d in enumerate(strings)}, "".join(strings).encode(), [0]
+        for d in strings:
+            offsets.append(offsets[-1] + len(d.encode()))
+        out = [cls.MAGIC, pack("<3I2H", len(paths), len(palettes), len(strings), len(paths[0]), len(palettes[0])),
+               pack(f"<{len(offsets)}I", *offsets), bytes(lookup[d] for k in paths for d in k),
+               b"".join(pack(f"<{len(k)}I", *(int(c[1:], 16) for c in k)) for k in palettes), blob]
+        Path(dst).write_bytes(b"".join(out))
+        return dst
+
+
+class Records:
+    """
+    Read-only sequence of path sets or palettes, loading the asset file at the first access.
+    """
+
+    def __init__(self, assets, kind):
+        self.assets, self.kind = assets, kind
+
+    def __len__(self):
+        return getattr(self.assets.load(), self.kind)
+
+    def __getitem__(self, i):
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError(f"{self.kind} index out of range")
+        return (self.assets.path_set if self.kind == "sets" else self.assets.palette)(i % n)
+
+
+ASSETS = Assets(Path(__file__).parent / f"{FILE if 'FILE' in globals() else 'final.bin'}")  # By convenience
+values, colors = Records(ASSETS, "sets"), Records(ASSETS, "palettes")  # Decoded on demand
 
 
 def demo(final: bytes) -> str:
     """
-    Creation of an avatar file in the temporary folder.
+    Creation of an avatar file in the temporary folder, unless the same content is already there.
     """
     try:
         filename = f"{gettempdir()}/{blake2b(final).hexdigest()}.svg"
-        with open(filename, "wb") as f:
-            f.write(final)
+        if not Path(filename).exists():
+            with open(filename, "wb") as f:
+                f.write(final)
         return filename
     except (AttributeError, NameError, PermissionError, TypeError) as err:
         raise err from err
 
 
-def make() -> Union[bool, bytes, str, None]:
+class RenderCache:
+    """
+    Bounded least recently used cache of rendered avatars, with hit, miss and eviction counters.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize, self.data = maxsize, OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        if key in self.data:
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value) -> NoReturn:
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.data)}
+
+
+CACHE = RenderCache()
+
+
+class Profiler:
+    """
+    Opt-in registry of wall time, call counts, bytes in and out and other counters for each stage of the pipeline.
+    .. note::
+        While disabled, a profiled function costs a single attribute test and a profiled iterator nothing at all.
+        The seconds of a stage include its nested stages, its self_seconds do not, as measured by each thread.
+    """
+
+    def __init__(self):
+        self.enabled, self.stages, self.local = False, {}, __import__("threading").local()
+
+    def __enter__(self):
+        self.enabled = True
+        return self
+
+    def __exit__(self, *_):
+        self.enabled = False
+
+    def enter(self) -> float:
+        self.local.__dict__.setdefault("stack", []).append(0.0)
+        return perf_counter()
+
+    def leave(self, stage: str, t: float, **counters) -> NoReturn:
+        t, stack = perf_counter() - t, self.local.stack
+        nested = stack.pop()
+        if stack:
+            stack[-1] += t
+        if self.enabled:
+            self.count(stage, seconds=t, self_seconds=t - nested, **{"calls": 1, **counters})
+
+    def count(self, stage: str, **counters) -> NoReturn:
+        k = self.stages.setdefault(stage, {})
+        for c, v in counters.items():
+            k[c] = k.get(c, 0) + v
+
+    def reset(self) -> NoReturn:
+        self.stages = {}
+
+    def stats(self) -> dict:
+        return {k: dict(v) for k, v in sorted(self.stages.items())}
+
+
+PROFILER = Profiler()
+
+
+def profiled(stage: str, counters=None):
+    """
+    Decorator recording each call of a function as a stage of the PROFILER, with the length of a bytes or str result
+    and the counters drawn from the result and the arguments.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            t = PROFILER.enter()
+            try:
+                res = fn(*args, **kwargs)
+            except BaseException:
+                PROFILER.leave(stage, t, errors=1)
+                raise
+            PROFILER.leave(stage, t, **({"bytes_out": len(res)} if isinstance(res, (bytes, bytearray, str)) else {}),
+                           **(counters(res, *args, **kwargs) if counters else {}))
+            return res
+        return wrapper
+    return decorator
+
+
+def profiled_iter(stage: str, iterable) -> Iterator:
+    """
+    Items of an iterable, each step recorded as a call of a stage of the PROFILER if enabled from the start.
+    """
+    if not PROFILER.enabled:
+        return iterable
+
+    def steps():
+        it = iter(iterable)
+        while True:
+            t = PROFILER.enter()
+            try:
+                item = next(it)
+            except StopIteration:
+                PROFILER.leave(stage, t, calls=0)
+                return
+            except BaseException:
+                PROFILER.leave(stage, t, errors=1)
+                raise
+            PROFILER.leave(stage, t, bytes_out=len(item) * getattr(item, "itemsize", 1))
+            yield item
+    return steps()
+
+
+@profiled("make")
+def make(legacy: bool = False, seed=None, mode: str = "paths") -> Union[bool, bytes, str, None]:
     """
     Checks if the XML-based vector image format graphics is created.
+    .. note::
+        A seed draws from a private random.Random, so that it always yields the same bytes for a given asset file,
+        and its rendering is kept in the CACHE. The same seed draws the same avatar in the paths, merged and classes
+        modes, see compact().
     """
+    if mode not in ("paths", "merged", "classes"):
+        raise Exception(f"Unknown mode {mode!r}.")
+    if seed is not None:
+        if (final := CACHE.get((seed, legacy, mode))) is None and (final := render(legacy, random.Random(seed), mode)):
+            CACHE.put((seed, legacy, mode), final)
+        return final
+    return render(legacy, random, mode)
+
+
+def render(legacy: bool = False, rng=random, mode: str = "paths") -> Union[bool, bytes, str, None]:
     try:
-        ska = Scalable()
-        res = choices(values)[0]
-        tree = ElementTree(fromstring(ska.svg)).getroot()  # No namespaces
-        for idx, k in enumerate(tree.findall(
-                "{http://www.w3.org/2000/svg}defs/{http://www.w3.org/2000/svg}g/"
-                "{http://www.w3.org/2000/svg}path")):
-            k.attrib["fill"], k.attrib["d"] = ska.fill(), res[idx]
-        return tostring(tree, encoding="utf-8").replace(b"ns0:", b"").replace(b":ns0", b"").replace(b'" />', b'"/>')
+        return serialize(*draw(legacy, rng)[1:], mode)
     except (AssertionError, IndexError, KeyError, RecursionError, TypeError, ValueError):
         return False
 
 
+def draw(legacy: bool = False, rng=random) -> tuple:
+    """
+    Index of the path set, its path data strings and their fills, as drawn by render() for the same rng.
+    :rtype: tuple
+    """
+    ska = Scalable(legacy, rng)
+    i = rng.choices(range(len(values)))[0]  # Same draw as rng.choices(values)
+    res = values[i]
+    return i, res, [ska.fill() for _ in res]
+
+
+def serialize(paths: list, fills: list, mode: str = "paths") -> bytes:
+    if mode != "paths":
+        return compact(fills, paths, mode)
+    frags, out = template(), []
+    for idx, d in enumerate(paths):
+        out += frags[2 * idx], fills[idx].encode(), frags[2 * idx + 1], d.encode()
+    out.append(frags[-1])
+    return b"".join(out)
+
+
+def compact(fills: list, paths: list, mode: str = "merged") -> bytes:
+    """
+    Serialized Scalable with minified path data, merged into a single path per fill or styled by a class per fill.
+    .. note::
+        The 32 paths of a set tile a quarter of the canvas without overlapping, so that neither their order nor
+        the nonzero winding of their union changes a pixel. The four <use> mirrors are kept.
+    :rtype: bytes
+    """
+    frags, groups = template(), {}
+    for fill, d in zip(fills, paths):
+        groups.setdefault(fill, []).append(minify(d))
+    head, sep = frags[0], frags[2]
+    if mode == "merged":
+        pairs = [(k, "".join(v)) for k, v in groups.items()]
+    else:
+        names = {k: chr(97 + i) for i, k in enumerate(groups)}  # Palettes hold a handful of colors
+        style = "".join(f".{v}{{fill:{k}}}" for k, v in names.items())
+        head = head.replace(b'fill="', b'class="').replace(b"<g", f"<style>{style}</style>\n    <g".encode(), 1)
+        sep = sep.replace(b'fill="', b'class="')
+        pairs = [(names[k], minify(d)) for k, d in zip(fills, paths)]
+    out = [head]
+    for i, (k, d) in enumerate(pairs):
+        out += sep if i else b"", k.encode(), frags[1], d.encode()
+    out.append(frags[-1])
+    return b"".join(out)
+
+
+async def make_async(legacy: bool = False, seed=None, executor=None,
+                     mode: str = "paths") -> Union[bool, bytes, str, None]:
+    """
+    Same as make() from a coroutine, in the event loop after a first await, or in a pool of threads or processes.
+    """
+    if executor is not None:
+        return await offload(make, legacy, seed, mode, executor=executor)
+    await __import__("asyncio").sleep(0)
+    return make(legacy, seed, mode)
+
+
+def make_many(n=None, seeds=None, workers=None, legacy: bool = False, chunk: int = 256,
+              mode: str = "paths") -> Iterator[tuple]:
+    """
+    Batch generation of (seed, avatar) pairs in seed order, sharded by chunks of seeds across worker processes.
+    .. note::
+        Workers only receive seeds and load the asset file themselves, at most 2 chunks per worker are in flight.
+        Without seeds, n random 64-bit seeds are drawn so that every avatar can be generated again, endlessly
+        without n either.
+    """
+    seeds = islice(iter(partial(random.getrandbits, 64), None) if seeds is None else seeds, n)
+    chunks = iter(lambda: list(islice(seeds, chunk)), [])
+    return _pool_map(partial(make_chunk, legacy=legacy, mode=mode), chunks, workers, _load_assets)
+
+
+def _pool_map(fn, chunks, workers=None, initializer=None) -> Iterator:
+    """
+    Items of the lists returned by fn for each chunk in order, in process for a single worker.
+    .. note::
+        At most 2 chunks per worker are in flight, so that memory does not grow with the number of chunks.
+    """
+    workers = (cpu_count() or 1) if workers is None else workers
+    if workers <= 1:
+        for k in chunks:
+            yield from fn(k)
+        return
+    futures = deque()
+    with __import__("concurrent.futures").futures.ProcessPoolExecutor(workers, initializer=initializer) as pool:
+        for k in chunks:
+            futures.append(pool.submit(fn, k))
+            if len(futures) >= 2 * workers:
+                yield from futures.popleft().result()
+        while futures:
+            yield from futures.popleft().result()
+
+
+def _load_assets() -> NoReturn:
+    ASSETS.load()  # Of the module of the worker, whatever its start method
+
+
+def make_chunk(seeds: list, legacy: bool = False, mode: str = "paths") -> list:
+    return [(seed, render(legacy, random.Random(seed), mode)) for seed in seeds]
+
+
+def make_unique(n=None, seeds=None, seen=None, legacy: bool = False, mode: str = "paths") -> Iterator[tuple]:
+    """
+    (seed, avatar) pairs of avatars whose canonical key is not in the seen set yet, adding it on the way.
+    .. note::
+        Repeats are rejected once drawn, before any rendering or hashing. Without seeds, random 64-bit seeds are
+        drawn until n avatars are yielded, otherwise at most n avatars are yielded from the given seeds.
+    """
+    seeds = iter(seeds) if seeds is not None else iter(lambda: random.getrandbits(64), None)
+    seen = SeenSet() if seen is None else seen
+
+    def unique():
+        for seed in seeds:
+            try:
+                i, res, fills = draw(legacy, random.Random(seed))
+            except (AssertionError, IndexError, KeyError, RecursionError, TypeError, ValueError):
+                continue
+            if seen.add(canonical(i, fills)):
+                yield seed, serialize(res, fills, mode)
+    return islice(unique(), n)
+
+
+def canonical(index: int, fills: list) -> int:
+    """
+    Compact integer key of an avatar, identical for any draw of the same image.
+    .. note::
+        From the most significant bits: path set index, 24-bit colors in order of first use, a 3-bit color slot
+        for each path and the number of colors. The partition is the count of each slot, and a palette drawn
+        twice under two indexes is the same key.
+    :rtype: int
+    """
+    slots, colors, assignment = {}, 0, 0
+    for fill in fills:
+        if fill not in slots:
+            slots[fill] = len(slots)
+            colors = colors << 24 | int(fill[1:], 16)
+        assignment = assignment << 3 | slots[fill]
+    return ((index << 24 * len(slots) | colors) << 3 * len(fills) | assignment) << 3 | len(slots)
+
+
+class SeenSet:
+    """
+    Bloom filter of canonical keys, sized for a capacity of keys at a rate of false positives, saved as a file.
+    .. note::
+        A repeat is always found, a false positive only skips an avatar never seen. The key space is far too large
+        for a bitmap, while the default 2 ** 20 keys at one in a million take 3.6 MiB with 20 probes.
+    """
+
+    MAGIC = b"BLM\x01"
+
+    def __init__(self, capacity: int = 1 << 20, error: float = 1e-6, size=None, probes=None, bits=None):
+        log = __import__("math").log
+        self.size = size or -int(capacity * log(error) // log(2) ** 2)
+        self.probes = probes or max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray(-(-self.size // 8)) if bits is None else bits
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key: int):
+        return all(self.bits[p >> 3] >> (p & 7) & 1 for p in self.positions(key))
+
+    def positions(self, key: int) -> Iterator[int]:
+        """
+        Probed bits of a key, by double hashing of the two halves of its 128-bit blake2b digest.
+        :long_url: https://en.wikipedia.org/wiki/Double_hashing
+        """
+        h = blake2b(key.to_bytes(key.bit_length() // 8 + 1, "little"), digest_size=16).digest()
+        a, b = int.from_bytes(h[:8], "little"), int.from_bytes(h[8:], "little") | 1
+        return ((a + i * b) % self.size for i in range(self.probes))
+
+    def add(self, key: int) -> bool:
+        """
+        Sets the bits of a key, true unless they were all set already.
+        :rtype: bool
+        """
+        new = False
+        for p in self.positions(key):
+            if not self.bits[p >> 3] >> (p & 7) & 1:
+                self.bits[p >> 3] |= 1 << (p & 7)
+                new = True
+        self.count += new
+        return new
+
+    def save(self, file) -> str:
+        tmp = Path(file).with_name(f".{Path(file).name}.tmp")
+        tmp.write_bytes(self.MAGIC + pack("<QIQ", self.size, self.probes, self.count) + self.bits)
+        replace(tmp, file)
+        return str(file)
+
+    @classmethod
+    def load(cls, file):
+        data = Path(file).read_bytes()
+        if data[:4] != cls.MAGIC:
+            raise Exception(f"{file} is not a seen set file.")
+        size, probes, count = unpack_from("<QIQ", data, 4)
+        seen = cls(size=size, probes=probes, bits=bytearray(data[24:]))
+        if len(seen.bits) != -(-size // 8):
+            raise Exception(f"{file} is truncated.")
+        seen.count = count
+        return seen
+
+
+class Sink:
+    """
+    Single destination of many avatars: a directory, a tar archive or stream, or a zip archive.
+    .. note::
+        Files of a directory and archives given by path are written under a temporary name, then renamed into place.
+    """
+
+    def __init__(self, target, kind=None):
+        name = str(target) if isinstance(target, (str, Path)) else ""
+        self.target, self.tmp, self.archive = target, None, None
+        self.kind = kind or ("zip" if name.endswith(".zip") else "tar" if not name or name.endswith(
+            (".tar", ".tar.gz", ".tgz")) else "dir")
+        if self.kind not in ("dir", "tar", "zip") or self.kind == "dir" and not name:
+            raise Exception(f"Unsupported {self.kind} sink of {type(target).__name__}.")
+        if self.kind == "dir":
+            Path(target).mkdir(parents=True, exist_ok=True)
+            return
+        if name:
+            self.tmp = Path(target).with_name(f".{Path(target).name}.tmp")
+        if self.kind == "zip":
+            zipfile = __import__("zipfile")
+            self.archive = zipfile.ZipFile(self.tmp or target, "w", zipfile.ZIP_DEFLATED)
+        elif not name:
+            self.archive = __import__("tarfile").open(fileobj=target, mode="w|")
+        else:
+            self.archive = __import__("tarfile").open(self.tmp, "w:gz" if name.endswith((".gz", ".tgz")) else "w")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        self.close(exc_type is None)
+
+    def write(self, name: str, data: bytes) -> NoReturn:
+        if self.kind == "dir":
+            tmp = Path(self.target) / f".{name}.tmp"
+            tmp.write_bytes(data)
+            replace(tmp, Path(self.target) / name)
+        elif self.kind == "zip":
+            self.archive.writestr(name, data)
+        else:
+            tarfile = __import__("tarfile")
+            info = tarfile.TarInfo(name)
+            info.size, info.mtime = len(data), int(__import__("time").time())
+            self.archive.addfile(info, __import__("io").BytesIO(data))
+
+    def add(self, final: bytes) -> str:
+        """
+        Writes an avatar under the blake2b name used by demo().
+        :rtype: str
+        """
+        name = f"{blake2b(final).hexdigest()}.svg"
+        self.write(name, final)
+        return name
+
+    def close(self, commit: bool = True) -> NoReturn:
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        if self.tmp is not None:
+            if commit:
+                replace(self.tmp, self.target)
+            else:
+                self.tmp.unlink(missing_ok=True)
+            self.tmp = None
+
+
+@lru_cache(1)
+@profiled("template", lambda res: {"bytes_out": sum(map(len, res))})
+def template() -> tuple:
+    """
+    Byte fragments of the serialized Scalable skeleton around its 64 fill and path data holes, compiled once.
+    .. note::
+        Holes are filled with palette hex colors and path commands, none of which needs XML escaping.
+    :rtype: tuple
+    """
+    tree = ElementTree(fromstring(Scalable.svg)).getroot()  # No namespaces
+    for k in tree.findall(
+            "{http://www.w3.org/2000/svg}defs/{http://www.w3.org/2000/svg}g/"
+            "{http://www.w3.org/2000/svg}path"):
+        k.attrib["fill"] = k.attrib["d"] = "\x01"
+    frags = tostring(tree, encoding="utf-8").replace(b"ns0:", b"").replace(b":ns0", b"").replace(b'" />', b'"/>')
+    return tuple(frags.split(b"\x01"))
+
+
+@lru_cache(None)
+@profiled("partitions", lambda res, *_: {"items": len(res)})
+def partitions(total: int, n: int, most: int = 17, least: int = 2) -> tuple:
+    """
+    Index of the integer partitions of total into n parts between least and most, enumerated once per arguments.
+    :rtype: tuple
+    """
+    return tuple(tuple(p) for p in Scalable.accelerate_asc(total) if len(p) == n and least <= p[0] and p[-1] <= most)
+
+
 class Scalable:
     """
     Generating artistic square Scalable Vector Graphics avatar.
@@ -74,16 +616,22 @@ class Scalable:
     def __repr__(self):
         return repr(self)
 
-    def __init__(self):
-        self.svg = "".join(('<svg shape-rendering="crispEdges" version="1.1" width="320" height="320" ',
-                            'xmlns="http://www.w3.org/2000/svg" xmlns:n="http://www.w3.org/1999/xlink">',
-                            '\n  <title>Right_click_to_save_as</title>\n', f'{"<defs>":>8}\n',
-                            f"""{"<g id='s'>":>14}\n""", f'''{f"""{'<path fill="" d=""/>':>26}{chr(10)}""" * 32}''',
-                            f'{"</g>":>8}\n', f'{"</defs>":>9}\n', f"""{"<use n:href='#s'/>":>20}\n""",
-                            "  <use n:href='#s' transform='matrix(1 0 0 -1 0 320)'/>\n",
-                            "  <use n:href='#s' transform='matrix(-1 0 0 1 320 0)'/>\n",
-                            "  <use n:href='#s' transform='rotate(180 160 160)'/>\n</svg>"))
-        self.out = self.generate(32, choices([4, 5], weights=[.2, .8], k=1)[0])
+    svg = "".join(('<svg shape-rendering="crispEdges" version="1.1" width="320" height="320" ',
+                   'xmlns="http://www.w3.org/2000/svg" xmlns:n="http://www.w3.org/1999/xlink">',
+                   '\n  <title>Right_click_to_save_as</title>\n', f'{"<defs>":>8}\n',
+                   f"""{"<g id='s'>":>14}\n""", f'''{f"""{'<path fill="" d=""/>':>26}{chr(10)}""" * 32}''',
+                   f'{"</g>":>8}\n', f'{"</defs>":>9}\n', f"""{"<use n:href='#s'/>":>20}\n""",
+                   "  <use n:href='#s' transform='matrix(1 0 0 -1 0 320)'/>\n",
+                   "  <use n:href='#s' transform='matrix(-1 0 0 1 320 0)'/>\n",
+                   "  <use n:href='#s' transform='rotate(180 160 160)'/>\n</svg>"))  # Skeleton compiled by template()
+
+    def __init__(self, legacy: bool = False, rng=random):
+        self.rng = rng  # The random module itself or a private random.Random
+        self.out = self.generate(32, rng.choices([4, 5], weights=[.2, .8], k=1)[0], rng)
+        self.legacy, self.cursor = legacy, 0
+        if not legacy:  # Each of the 32 slots drawn in proportion to the remaining stock of its color
+            self.seq = [k for k, v in self.out.items() for _ in range(v)]
+            rng.shuffle(self.seq)
 
     @staticmethod
     def accelerate_asc(n: int) -> Iterator[list]:
@@ -109,24 +657,27 @@ class Scalable:
             y = x + y - 1
             yield z[:k + 1]
 
-    @lru_cache(0)
-    def generate(self, total: int, n: int) -> dict:
+    @staticmethod
+    def generate(total: int, n: int, rng=random) -> dict:
         """
         A palette of color combinations that tends to be aesthetically pleasing.
         :long_url: https://en.wikipedia.org/wiki/Harmony_(color)
         :rtype: dict
         """
-        out = [p for p in self.accelerate_asc(total) if all(_ <= 17 for _ in p) and len(p) == n and 1 not in p]
-        r = choices(out)[0]
-        shuffle(colors)  # shuffle(r)
-        return dict(zip(choices(colors)[0], r))
+        r = rng.choices(partitions(total, n))[0]
+        return dict(zip(colors[rng.randrange(len(colors))], r))  # Shared palettes left unshuffled
 
     def fill(self) -> str:
         """
         Manipulating dictionary of color strings with their respective amounts.
+        .. note::
+            Advances through the shuffled sequence, the legacy mode draws uniformly among the colors left in stock.
         :rtype: str
         """
-        r = choices(list(self.out), k=1)[0]
+        if not self.legacy:
+            self.cursor += 1
+            return self.seq[self.cursor - 1]
+        r = self.rng.choices(list(self.out), k=1)[0]
         d = {k: v - 1 if k == r else self.out[k] for k, v in self.out.items()}
         self.out = {k: v for k, v in d.items() if v}
         return r
@@ -135,26 +686,57 @@ class Scalable:
 class ReaderPNG:
     """This class provides methods to read simple PNG avatars."""
 
-    def __init__(self, file=None):
-        self.file = __import__("io").BytesIO(file)
-        self.signature = self.transparent = self.atchunk = self.compression = None
+    def __init__(self, file=None, crc: bool = False, max_pixels: int = 1 << 26, max_bytes: int = 1 << 28):
+        self.map = None
+        if isinstance(file, (str, Path)):  # Straight from disk
+            with open(file, "rb") as f:
+                try:
+                    file = self.map = mmap(f.fileno(), 0, access=ACCESS_READ)
+                except (OSError, TypeError, ValueError):  # Empty files and file systems without mmap
+                    file = f.read()
+        try:
+            self.mem, self.stream = memoryview(b"" if file is None else file), None
+        except TypeError:  # Binary file-like object, read a chunk at a time
+            self.mem, self.stream = None, file
+        self.crc, self.chunk_index, self.cursor, self.ahead = crc, None, 0, None
+        self.max_pixels, self.max_bytes = max_pixels, max_bytes
+        self.signature = self.transparent = self.compression = None
         self.height = self.bitdepth = self.color_type = self.trns = self.gamma = None
         self.filter = self.colormap = self.greyscale = self.alpha = None
         self.color_planes = self.planes = self.psize = self.plte = self.sbit = None
         self.interlace = self.row_bytes = self.width = self.background = 0
         self.phys = self.x_pixels_per_unit = self.y_pixels_per_unit = self.unit_is_meter = 0
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self) -> NoReturn:
+        """
+        Releases the memory map of a file given by its path, rows already decoded are copies.
+        .. note::
+            Chunks still referenced keep the map open until they are collected.
+        """
+        if self.map is not None:
+            try:
+                self.mem.release()
+                self.map.close()
+            except BufferError:
+                pass
+            self.map = self.mem = None
+
     def chunk(self):
-        self.validate_signature()
-        if not self.atchunk:
-            self.atchunk = self._chunk_len_type()
-        if not self.atchunk:
+        if self.stream is not None:
+            k = self._header()
+            return (b"IEND", 0) if k is None else (k[0], b"".join(self._payload(*k)))
+        index = self.index()
+        if self.cursor >= len(index):
             return b"IEND", 0
-        length, tag = self.atchunk
-        self.atchunk = None
-        data = self.file.read(length)
-        _ = self.file.read(4)
-        return tag, data
+        tag, offset, length = index[self.cursor]
+        self.cursor += 1
+        return tag, self.mem[offset:offset + length]
 
     def chunks(self):
         while True:
@@ -163,12 +745,13 @@ class ReaderPNG:
             if t == b"IEND" or t is None:
                 break
 
+    @profiled("unfilter", lambda res, self, flt, *_: {f"filter_{flt}": 1})
     def undo_filter(self, flt, scanline, previous):
         result = scanline
         if flt == 0:
             return result
         if flt not in (1, 2, 3, 4):
-            Exception("Invalid PNG filter type.")
+            raise Exception("Invalid PNG filter type.")
         fu = max(1, self.psize)
         if not previous:
             previous = bytearray([0] * len(scanline))
@@ -184,67 +767,163 @@ class ReaderPNG:
         if self.bitdepth == 8:
             return bytearray(bs)
         if self.bitdepth == 16:
-            return [int.from_bytes((chr(pn) + chr(bs[1::2][i])).encode(), "big") for i, pn in enumerate(bs[::2])]
-        if width is None:
-            width = self.width
-        spb = 8 // self.bitdepth
-        out = bytearray()
-        mask = 2 ** self.bitdepth - 1
-        shifts = [self.bitdepth * i for i in reversed(list(range(spb)))]
-        for o in bs:
-            out.extend([mask & (o >> i) for i in shifts])
-        return out[:width]
+            out = array("H", bytes(bs))
+            if byteorder == "little":  # Network byte order
+                out.byteswap()
+            return out
+        out = bytearray().join(map(unpack_table(self.bitdepth).__getitem__, bs))
+        del out[self.width if width is None else width:]  # Padding bits of the last byte
+        return out
 
     def _iter_straight_packed(self, byte_blocks):
-        rb = self.row_bytes
+        rb, n = self.row_bytes, 0
         a = bytearray()
-        recon = None
+        recon, previous = bytearray(rb), bytearray(rb)  # Reused, each row is copied by _bytes_to_values
         for some_bytes in byte_blocks:
             a.extend(some_bytes)
-            while len(a) >= rb + 1:
-                filter_type = a[0]
-                scanline = a[1:rb + 1]
-                del a[:rb + 1]
-                recon = self.undo_filter(filter_type, scanline, recon)
-                yield recon
-        if len(a) != 0:
+            i = 0
+            with memoryview(a) as mv:
+                while len(a) - i >= rb + 1:
+                    filter_type = a[i]
+                    recon[:] = mv[i + 1:i + rb + 1]
+                    i += rb + 1
+                    self.undo_filter(filter_type, recon, previous)
+                    n += 1
+                    yield recon
+                    recon, previous = previous, recon
+            del a[:i]
+        if len(a) != 0 or n < self.height:
             raise Exception("Wrong size for decompressed IDAT chunk.")
 
+    def _iter_interlaced(self, byte_blocks):
+        """
+        Rows of an Adam7 image, the scanlines of its seven reduced passes being scattered into a preallocated
+        buffer as soon as they are inflated.
+        .. note::
+            Each pass is filtered on its own, and is empty when it has no column or no row.
+        :long_url: https://www.w3.org/TR/png/#8Interlace
+        """
+        w, h, planes, bits = self.width, self.height, self.planes, self.bitdepth * self.planes
+        stride = w * planes
+        out = array("H", bytes(2 * stride * h)) if self.bitdepth == 16 else bytearray(stride * h)
+        specs = ((xs, dx, y, -(-(w - xs) // dx), y == ys) for xs, ys, dx, dy in ADAM7 if xs < w
+                 for y in range(ys, h, dy))
+        spec, previous, a = next(specs, None), None, bytearray()
+        for some_bytes in byte_blocks:
+            a.extend(some_bytes)
+            i = 0
+            while spec and len(a) - i > (rb := -(-spec[3] * bits // 8)):
+                xs, dx, y, pw, first = spec
+                line = a[i + 1:i + rb + 1]
+                self.undo_filter(a[i], line, None if first else previous)
+                i += rb + 1
+                values = self._bytes_to_values(line, pw)
+                for p in range(planes):
+                    out[y * stride + xs * planes + p:(y + 1) * stride:dx * planes] = values[p::planes]
+                spec, previous = next(specs, None), line
+            del a[:i]
+        if spec or a:
+            raise Exception("Wrong size for decompressed IDAT chunk.")
+        for y in range(h):
+            yield out[y * stride:(y + 1) * stride]
+
     def validate_signature(self):
         if self.signature:
             return
-        self.signature = self.file.read(8)
+        self.signature = self._read_exact(8) if self.stream is not None else bytes(self.mem[:8])
         if len(self.signature) == 0:
             raise EOFError("End of PNG stream.")
         if self.signature != b"\x89PNG\r\n\x1a\n":
             raise Exception("PNG file has an invalid signature.")
 
     def preamble(self):
-        self.validate_signature()
-        while True:
-            if not self.atchunk:
-                self.atchunk = self._chunk_len_type()
-                if self.atchunk is None:
-                    break
-            if self.atchunk[1] == b"IDAT":
-                return
+        if self.stream is not None:
+            while (k := self._header()) is not None and k[0] != b"IDAT":
+                self.ahead = k
+                self.process_chunk()
+            self.ahead = k  # Left for read()
+            return
+        index = self.index()
+        while self.cursor < len(index) and index[self.cursor][0] != b"IDAT":
             self.process_chunk()
 
-    def _chunk_len_type(self):
-        x = self.file.read(8)
+    def _header(self):
+        if self.ahead is not None:
+            k, self.ahead = self.ahead, None
+            return k
+        self.validate_signature()
+        x = self._read_exact(8)
         if not x:
             return None
         if len(x) != 8:
             raise Exception("End of file whilst reading chunk length/type.")
-        length = int.from_bytes(x[2:4], "big")
-        tag = x[4:]
+        length, tag = unpack_from(">I4s", x)
+        self._check(tag, length)
+        return tag, length
+
+    def _payload(self, tag, length, size: int = 1 << 16) -> Iterator[bytes]:
+        """
+        Data of a chunk of the stream in pieces of at most size bytes, then its CRC-32 checked on the fly.
+        """
+        value = checksum(tag)
+        while length:
+            piece = self.stream.read(min(size, length))
+            if not piece:
+                raise Exception(f"Chunk {tag} is truncated.")
+            length -= len(piece)
+            if self.crc:
+                value = checksum(piece, value)
+            yield piece
+        x = self._read_exact(4)
+        if len(x) != 4:
+            raise Exception(f"Chunk {tag} is truncated.")
+        if self.crc and value != unpack_from(">I", x)[0]:
+            raise Exception(f"Chunk {tag} has an invalid CRC-32.")
+
+    def _read_exact(self, n: int) -> bytes:
+        """
+        Next n bytes of the stream, fewer only at its end, however short the reads of a raw stream are.
+        :rtype: bytes
+        """
+        out = self.stream.read(n)
+        while 0 < len(out) < n and (k := self.stream.read(n - len(out))):
+            out += k
+        return out
+
+    @staticmethod
+    def _check(tag, length) -> NoReturn:
         if length > 2 ** 31 - 1:
             raise Exception(f"Chunk {tag} is too large: {length}.")
-
-        type_bytes = set(bytearray(tag))
-        if not type_bytes <= set(range(65, 91)) | set(range(97, 123)):
+        if not tag.isalpha():
             raise Exception(f"Chunk {list(tag)} has an invalid chunk type.")
-        return length, tag
+
+    def index(self) -> list:
+        """
+        Tag, offset and length of every chunk, scanned in one pass without copying any payload.
+        .. note::
+            Chunks are then handed out as memoryview slices, so that the metadata of a large file can be read
+            without touching its IDAT data. CRC-32 checks are optional.
+        :rtype: list
+        """
+        if self.chunk_index is not None:
+            return self.chunk_index
+        self.validate_signature()
+        mem, pos, end, out = self.mem, 8, len(self.mem), []
+        while pos < end:
+            if end - pos < 8:
+                raise Exception("End of file whilst reading chunk length/type.")
+            length, tag = unpack_from(">I4s", mem, pos)
+            self._check(tag, length)
+            if pos + 12 + length > end:
+                raise Exception(f"Chunk {tag} is truncated.")
+            if self.crc and checksum(mem[pos + 4:pos + 8 + length]) != unpack_from(">I", mem, pos + 8 + length)[0]:
+                raise Exception(f"Chunk {tag} has an invalid CRC-32.")
+            out.append((tag, pos + 8, length))
+            pos += 12 + length
+            if tag == b"IEND":
+                break
+        self.chunk_index = out
+        return out
 
     def process_chunk(self) -> NoReturn:
         tag, data = self.chunk()
@@ -255,13 +934,11 @@ class ReaderPNG:
     def _process_IHDR(self, data) -> NoReturn:
         if len(data) != 13:
             raise Exception("IHDR chunk has incorrect length.")
-        self.width = int.from_bytes(data[2:4], "big")
-        self.height = int.from_bytes(data[5:8], "big")
-        self.bitdepth = int.from_bytes(data[8:9], "big")
-        self.color_type = int.from_bytes(data[9:10], "big")
-        self.compression = int.from_bytes(data[10:11], "big")
-        self.filter = int.from_bytes(data[11:12], "big")
-        self.interlace = int.from_bytes(data[12:13], "big") * 0  # None
+        self.width, self.height, self.bitdepth, self.color_type, self.compression, self.filter, interlace = \
+            unpack_from(">2I5B", data)
+        if interlace not in (0, 1):
+            raise Exception(f"Unknown interlace method {interlace}.")
+        self.interlace = interlace
         colormap = bool(self.color_type & 1)
         greyscale = not self.color_type & 2
         alpha = bool(self.color_type & 4)
@@ -274,7 +951,25 @@ class ReaderPNG:
         self.planes = planes
         self.psize = float(self.bitdepth) / float(8) * planes
         self.psize = int(self.psize) if int(self.psize) == self.psize else self.psize
-        self.row_bytes = int(-(-self.width * self.psize))
+        self.row_bytes = -(-self.width * self.bitdepth * planes // 8)
+        if self.max_pixels is not None and self.width * self.height > self.max_pixels:
+            raise Exception(f"Image of {self.width}x{self.height} pixels exceeds {self.max_pixels} pixels.")
+        if self.max_bytes is not None and self.raw_size() > self.max_bytes:
+            raise Exception(f"Image of {self.raw_size()} decompressed bytes exceeds {self.max_bytes} bytes.")
+
+    def raw_size(self) -> int:
+        """
+        Length of the decompressed IDAT stream announced by the header, filter type bytes included.
+        :rtype: int
+        """
+        if not self.interlace:
+            return self.height * (self.row_bytes + 1)
+        n, bits = 0, self.bitdepth * self.planes
+        for xs, ys, dx, dy in ADAM7:
+            if xs < self.width and ys < self.height:
+                pw = -(-(self.width - xs) // dx)
+                n += -(-(self.height - ys) // dy) * (-(-pw * bits // 8) + 1)
+        return n
 
     def _process_PLTE(self, data) -> NoReturn:
         if self.plte:
@@ -330,9 +1025,23 @@ class ReaderPNG:
         self.phys = data
         if len(data) != 9:
             raise Exception("pHYs chunk has incorrect length.")
-        self.x_pixels_per_unit, self.y_pixels_per_unit, unit = data[3], data[7], data[8]
+        self.x_pixels_per_unit, self.y_pixels_per_unit, unit = unpack_from(">2IB", data)
         self.unit_is_meter = bool(unit)
 
+    @staticmethod
+    def iterdec(byte_blocks, limit=None):  # Streamed across chunks
+        d, n = Inflater(limit), 0
+
+        def pieces():
+            for data in byte_blocks:
+                yield from d.pieces(data)
+            yield d.flush()
+        for out in pieces():
+            n += len(out)
+            if limit is not None and n > limit:  # Decompression bomb or corrupted stream
+                raise Exception("Decompressed IDAT data exceeds the image size.")
+            yield out
+
     @staticmethod
     def dec(data):  # For Zlib decompression
         r = BitReader(data)
@@ -343,17 +1052,28 @@ class ReaderPNG:
     def read(self):
         def iteridat():
             while True:  # Slower
-                tag, data = self.chunk()
+                if self.stream is None:
+                    tag, data = self.chunk()
+                    pieces = (data,)
+                else:
+                    k = self._header()
+                    tag, pieces = (b"IEND", ()) if k is None else (k[0], self._payload(*k))
                 if tag == b"IEND":
                     break
                 if tag != b"IDAT":
+                    for _ in pieces:  # Skipped
+                        pass
                     continue
                 if self.colormap and not self.plte:
                     Exception("PLTE chunk is required before IDAT chunk")
-                yield data
+                yield from pieces
 
         self.preamble()
-        rows = self._iter_bytes_to_values(self._iter_straight_packed([self.dec(data) for data in iteridat()]))
+        blocks = profiled_iter("inflate", self.iterdec(iteridat(), self.raw_size()))
+        if self.interlace:
+            rows = self._iter_interlaced(blocks)
+        else:
+            rows = self._iter_bytes_to_values(self._iter_straight_packed(blocks))
         info = {}
         for attr in ["greyscale", "alpha", "planes", "bitdepth", "interlace"]:
             info[attr] = getattr(self, attr)
@@ -373,19 +1093,24 @@ class ReaderPNG:
 
     def as_direct(self):
         self.preamble()
-        if not self.colormap and not self.trns and not self.sbit:
-            return self.read()  # Simple case
         x, y, pixels, info = self.read()
+        if not self.colormap and not self.trns and not self.sbit:
+            return x, y, profiled_iter("decode", pixels), info  # Simple case
         if self.colormap:
             info["colormap"] = False
             info["alpha"] = bool(self.trns)
             info["bitdepth"] = 8
             info["planes"] = 3 + bool(self.trns)
-            plte = self.palette()
+            n = info["planes"]
+            tables = [bytes(self.plte[i::3]).ljust(256, b"\0") for i in range(3)]
+            if self.trns:  # Opaque past the tRNS entries
+                tables.append(bytes(self.trns).ljust(256, b"\xff"))
+
             def iterpal(pix):
                 for row in pix:
-                    row = [plte[z] for z in row]
-                    k = [i for sub in list(zip(*row)) for i in sub]
+                    k = bytearray(n * len(row))
+                    for i, t in enumerate(tables):
+                        k[i::n] = row.translate(t)
                     yield k
             pixels = iterpal(pixels)
         targetbitdepth = None
@@ -399,137 +1124,222 @@ class ReaderPNG:
         if targetbitdepth:
             shift = info["bitdepth"] - targetbitdepth
             info["bitdepth"] = targetbitdepth
+            table = bytes(p >> shift for p in range(256))
+
             def itershift(pxs):
+                numpy = _numpy()
                 for row in pxs:
-                    yield [p >> shift for p in row]
+                    if isinstance(row, array):
+                        yield array("H", (numpy.frombuffer(row, numpy.uint16) >> shift).tobytes()) if numpy \
+                            else array("H", [p >> shift for p in row])
+                    else:
+                        yield row.translate(table)
             pixels = itershift(pixels)
-        return x, y, pixels, info
+        return x, y, profiled_iter("decode", pixels), info
+
+    async def as_direct_async(self, budget: float = 0.008):
+        """
+        Same as as_direct() from a coroutine, with an asynchronous iterator of the rows that hands control back to
+        the event loop once per time slice, between two scanlines.
+        """
+        await __import__("asyncio").sleep(0)
+        x, y, pixels, info = self.as_direct()
+        return x, y, cooperate(pixels, budget), info
 
     @staticmethod
     def undo_filter_sub(filter_unit, scanline, _, result):
-        ai = 0
-        for i in range(filter_unit, len(result)):
-            x = scanline[i]
-            a = result[ai]
-            result[i] = (x + a) & 0xff
-            ai += 1
+        """
+        Prefix sums of each pixel-stride lane, with NumPy or by doubling SWAR additions over the whole row.
+        :long_url: https://en.wikipedia.org/wiki/SWAR
+        """
+        n, numpy = len(result), _numpy()
+        if numpy and n % filter_unit == 0:
+            r = numpy.frombuffer(result, numpy.uint8).reshape(-1, filter_unit)
+            numpy.cumsum(numpy.frombuffer(scanline, numpy.uint8).reshape(-1, filter_unit), 0, numpy.uint8, r)
+            return
+        lo, hi, full = swar_masks(n)
+        x, shift = int.from_bytes(scanline, "little"), 8 * filter_unit
+        while shift < 8 * n:
+            y = (x << shift) & full
+            x = ((x & lo) + (y & lo)) ^ ((x ^ y) & hi)
+            shift <<= 1
+        result[:] = x.to_bytes(n, "little")
 
     @staticmethod
     def undo_filter_up(_, scanline, previous, result):
-        for i, _ in enumerate(result):
-            x = scanline[i]
-            b = previous[i]
-            result[i] = (x + b) & 0xff
+        n, numpy = len(result), _numpy()
+        if numpy:
+            numpy.add(numpy.frombuffer(scanline, numpy.uint8), numpy.frombuffer(previous, numpy.uint8, n),
+                      out=numpy.frombuffer(result, numpy.uint8))
+            return
+        lo, hi, _ = swar_masks(n)
+        x, y = int.from_bytes(scanline, "little"), int.from_bytes(previous[:n], "little")
+        result[:] = (((x & lo) + (y & lo)) ^ ((x ^ y) & hi)).to_bytes(n, "little")
 
     @staticmethod
     def undo_filter_average(filter_unit, scanline, previous, result):
-        ai = -filter_unit
-        for i, _ in enumerate(result):
-            x = scanline[i]
-            if ai < 0:
-                a = 0
-            else:
-                a = result[ai]
-            b = previous[i]
-            result[i] = (x + ((a + b) >> 1)) & 0xff
-            ai += 1
+        for j in range(filter_unit):
+            a, lane = 0, []
+            for x, b in zip(scanline[j::filter_unit], previous[j::filter_unit]):
+                a = (x + ((a + b) >> 1)) & 0xff
+                lane.append(a)
+            result[j::filter_unit] = lane
 
     @staticmethod
     def undo_filter_paeth(filter_unit, scanline, previous, result):
-        ai = -filter_unit
-        for i, _ in enumerate(result):
-            x = scanline[i]
-            if ai < 0:
-                a = c = 0
-            else:
-                a = result[ai]
-                c = previous[ai]
-            b = previous[i]
-            p = a + b - c
-            pa = abs(p - a)
-            pb = abs(p - b)
-            pc = abs(p - c)
-            if pa <= pb and pa <= pc:
-                pr = a
-            elif pb <= pc:
-                pr = b
-            else:
-                pr = c
-            result[i] = (x + pr) & 0xff
-            ai += 1
+        for j in range(filter_unit):
+            a = c = 0
+            lane = []
+            for x, b in zip(scanline[j::filter_unit], previous[j::filter_unit]):
+                pa, pb = b - c, a - c  # Distances |p - a|, |p - b| and |p - c| with p = a + b - c
+                pc = pa + pb
+                if pa < 0:
+                    pa = -pa
+                if pb < 0:
+                    pb = -pb
+                if pc < 0:
+                    pc = -pc
+                a = (x + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xff
+                c = b
+                lane.append(a)
+            result[j::filter_unit] = lane
+
+
+ADAM7 = ((0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4), (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2))
+
+
+@lru_cache(3)
+def unpack_table(bitdepth: int) -> tuple:
+    """
+    Samples packed in each byte value at a depth of 1, 2 or 4 bits, the most significant first.
+    :rtype: tuple
+    """
+    mask = (1 << bitdepth) - 1
+    return tuple(bytes(o >> i & mask for i in range(8 - bitdepth, -1, -bitdepth)) for o in range(256))
+
+
+@lru_cache(16)
+def swar_masks(n: int) -> tuple:
+    """
+    Masks of the low seven bits, the high bit and all the bytes of an n-byte integer, for carry-less byte additions.
+    :rtype: tuple
+    """
+    return int.from_bytes(b"\x7f" * n, "little"), int.from_bytes(b"\x80" * n, "little"), (1 << 8 * n) - 1
+
+
+@lru_cache(1)
+def crc_table() -> tuple:
+    """
+    CRC-32 of each byte value, for the reflected polynomial shared by PNG and zlib.
+    :long_url: https://www.w3.org/TR/png/#D-CRCAppendix
+    :rtype: tuple
+    """
+    out = []
+    for n in range(256):
+        for _ in range(8):
+            n = n >> 1 ^ 0xedb88320 if n & 1 else n >> 1
+        out.append(n)
+    return tuple(out)
+
+
+def checksum(data, value: int = 0) -> int:
+    if crc32:
+        return crc32(data, value)
+    c, t = value ^ 0xffffffff, crc_table()
+    for b in data:  # Byte at a time, without the native zlib module
+        c = t[(c ^ b) & 0xff] ^ c >> 8
+    return c ^ 0xffffffff
 
 
 class BitReader:
     def __init__(self, mem=None):
-        self.mem = mem
+        self.mem = memoryview(mem) if mem is not None else None
         self.pos = 0
         self.b = 0
         self.numbits = 0
-        self.root = type("Node", (object,), {"symbol": "", "left": None, "right": None})()  # Compacted
-        self.root.symbol = ""
-
-    def insert(self, codeword, n, symbol):
-        node = self.root
-        for i in range(n - 1, -1, -1):
-            b = codeword & (1 << i)
-            if b:
-                next_node = node.right
-                if next_node is None:
-                    node.right = type("Node", (object,), {"symbol": "", "left": None, "right": None})()
-                    next_node = node.right
-            else:
-                next_node = node.left
-                if next_node is None:
-                    node.left = type("Node", (object,), {"symbol": "", "left": None, "right": None})()
-                    next_node = node.left
-            node = next_node
-        node.symbol = symbol
+        self.blocks = self.symbols = 0  # Decoded so far
+        self.limit = None  # Largest output of a block, checked at each match
+
+    def refill(self):
+        """
+        Tops up the bit accumulator with the next little-endian 32-bit word of the stream.
+        .. note::
+            Reads past the end are zero-padded so that peeks may run ahead of the last symbol.
+        """
+        if self.numbits < 32:
+            self.b |= int.from_bytes(self.mem[self.pos:self.pos + 4], "little") << self.numbits
+            self.pos += 4
+            self.numbits += 32
+            if self.pos > len(self.mem) + 8:
+                raise EOFError("End of deflate stream.")
 
     def read_byte(self):
-        self.numbits = 0
-        b = self.mem[self.pos]
-        self.pos += 1
-        return b
+        self.align()
+        return self.read_bits(8)
 
     def read_bit(self):
-        if self.numbits <= 0:
-            self.b = self.read_byte()
-            self.numbits = 8
-        self.numbits -= 1
-        bit = self.b & 1
-        self.b >>= 1
-        return bit
+        return self.read_bits(1)
 
     def read_bits(self, n):
-        o = 0
-        for i in range(n):
-            o |= self.read_bit() << i
+        if self.numbits < n:
+            self.refill()
+        o = self.b & ((1 << n) - 1)
+        self.b >>= n
+        self.numbits -= n
         return o
 
+    def peek_bits(self, n):
+        if self.numbits < n:
+            self.refill()
+        return self.b & ((1 << n) - 1)
+
+    def drop_bits(self, n):
+        self.b >>= n
+        self.numbits -= n
+
+    def align(self):
+        self.drop_bits(self.numbits & 7)
+
     def inflate_block_dynamic(self, r, o):
-        literal_length_tree, distance_tree = self.decode_trees(r)
-        self.inflate_block_data(r, literal_length_tree, distance_tree, o)
+        literal_length_table, distance_table = self.decode_trees(r)
+        self.inflate_block_data(r, literal_length_table, distance_table, o)
 
     def inflate_block_fixed(self, r, o):
-        bl = ([8 for _ in range(144)] + [9 for _ in range(144, 256)] +
-              [7 for _ in range(256, 280)] + [8 for _ in range(280, 288)])
-        literal_length_tree = self.bl_list_to_tree(bl, range(286))
-        bl = [5 for _ in range(30)]
-        distance_tree = self.bl_list_to_tree(bl, range(30))
-        self.inflate_block_data(r, literal_length_tree, distance_tree, o)
+        self.inflate_block_data(r, FIXED_LITERAL, FIXED_DISTANCE, o)
 
+    @staticmethod
+    def inflate_block_stored(r, o):
+        r.align()
+        length, nlength = r.read_bits(16), r.read_bits(16)
+        if length != nlength ^ 0xffff:
+            raise Exception("invalid stored block length")
+        start = r.pos - r.numbits // 8  # Whole bytes left in the accumulator go back to the stream
+        if start + length > len(r.mem):
+            raise EOFError("End of deflate stream.")
+        o += r.mem[start:start + length]
+        r.pos, r.b, r.numbits = start + length, 0, 0
+
+    def inflate_block(self, r, o):
+        bfinal = r.read_bit()
+        btype = r.read_bits(2)
+        if btype == 0:
+            self.inflate_block_stored(r, o)
+        elif btype == 1:
+            self.inflate_block_fixed(r, o)
+        elif btype == 2:
+            self.inflate_block_dynamic(r, o)
+        else:
+            raise Exception("invalid btype")
+        self.blocks += 1
+        return bfinal
+
+    @profiled("inflate", lambda res, self, r: {"bytes_in": r.pos - r.numbits // 8, "blocks": self.blocks,
+                                               "symbols": self.symbols})
     def inflate(self, r):
         bfinal = 0
-        out = []
+        out = bytearray()
         while not bfinal:
-            bfinal = r.read_bit()
-            btype = r.read_bits(2)
-            if btype == 1:
-                self.inflate_block_fixed(r, out)
-            elif btype == 2:
-                self.inflate_block_dynamic(r, out)
-            else:
-                raise Exception("invalid btype")
+            bfinal = self.inflate_block(r, out)
         return bytes(out)
 
     def decode_trees(self, r):
@@ -539,10 +1349,10 @@ class BitReader:
         code_length_tree_bl = [0 for _ in range(19)]
         for i in range(hclen):
             code_length_tree_bl[[16, 17, 18, 0, 8, 7, 9, 6, 10, 5, 11, 4, 12, 3, 13, 2, 14, 1, 15][i]] = r.read_bits(3)
-        code_length_tree = self.bl_list_to_tree(code_length_tree_bl, range(19))
+        code_length_table = self.bl_list_to_table(code_length_tree_bl)
         bl = []
         while len(bl) < hlit + hdist:
-            sym = self.decode_symbol(r, code_length_tree)
+            sym = self.decode_symbol(r, code_length_table)
             if 0 <= sym <= 15:
                 bl.append(sym)
             elif sym == 16:
@@ -557,93 +1367,805 @@ class BitReader:
                 bl.extend(0 for _ in range(repeat_length))
             else:
                 raise Exception("invalid symbol")
-        literal_length_tree = self.bl_list_to_tree(bl[:hlit], range(286))
-        distance_tree = self.bl_list_to_tree(bl[hlit:], range(30))
-        return literal_length_tree, distance_tree
+        literal_length_table = self.bl_list_to_table(bl[:hlit])
+        distance_table = self.bl_list_to_table(bl[hlit:])
+        return literal_length_table, distance_table
 
     @staticmethod
-    def bl_list_to_tree(bl, alphabet):
-        bl_count = [sum(1 for x in bl if x == y and y != 0) for y in range(max(bl) + 1)]
-        next_code = [0, 0]
-        for bits in range(2, max(bl) + 1):
-            next_code.append((next_code[bits - 1] + bl_count[bits - 1]) << 1)
-        t = BitReader()  # super()
-        for c, bitlen in zip(alphabet, bl):
+    def bl_list_to_table(bl):
+        """
+        Canonical Huffman lookup tables from a list of code lengths, in the manner of zlib's fast/slow tables.
+        .. note::
+            Fast entries are indexed by the next FAST_BITS stream bits and hold ``length << 9 | symbol``,
+            longer codes fall back to the per-length counts and symbols sorted by code.
+        :long_url: https://en.wikipedia.org/wiki/Canonical_Huffman_code
+        :rtype: tuple
+        """
+        count = [0] * 16
+        for x in bl:
+            count[x] += 1
+        count[0] = 0
+        offs, symbol = [0] * 16, [0] * sum(count)
+        for bits in range(1, 15):
+            offs[bits + 1] = offs[bits] + count[bits]
+        fast, code, next_code = [0] * (1 << FAST_BITS), 0, [0] * 16
+        for bits in range(1, 16):
+            code = (code + count[bits - 1]) << 1
+            next_code[bits] = code
+        for c, bitlen in enumerate(bl):
             if bitlen != 0:
-                t.insert(next_code[bitlen], bitlen, c)
+                symbol[offs[bitlen]] = c
+                offs[bitlen] += 1
+                if bitlen <= FAST_BITS:
+                    k = int(f"{next_code[bitlen]:0{bitlen}b}"[::-1], 2)  # Stream order is least significant first
+                    fast[k::1 << bitlen] = [bitlen << 9 | c] * (1 << FAST_BITS - bitlen)
                 next_code[bitlen] += 1
-        return t
+        return fast, count, symbol
 
     @staticmethod
     def decode_symbol(r, t):
-        node = t.root
-        while node.left or node.right:
-            b = r.read_bit()
-            node = node.right if b else node.left
-        return node.symbol
-
-    def inflate_block_data(self, r, literal_length_tree, distance_tree, out):
+        fast, count, symbol = t
+        e = fast[r.peek_bits(FAST_BITS)]
+        if e:
+            r.drop_bits(e >> 9)
+            return e & 511
+        code = first = index = 0
+        for bits in range(1, 16):  # Canonical walk for codes longer than the fast table
+            code |= r.read_bit()
+            n = count[bits]
+            if code - n < first:
+                return symbol[index + code - first]
+            index += n
+            first = (first + n) << 1
+            code <<= 1
+        raise Exception("invalid Huffman code")
+
+    def inflate_block_data(self, r, literal_length_table, distance_table, out):
+        """
+        Hot loop of the decoder, on a local copy of the bit accumulator refilled one word at a time.
+        .. note::
+            Matches are copied by slices, overlapping ones by repeating the period of ``dist`` bytes.
+        :long_url: https://en.wikipedia.org/wiki/LZ77_and_LZ78
+        """
+        literal_fast, distance_fast, mem, end = literal_length_table[0], distance_table[0], r.mem, len(r.mem) + 8
+        b, k, pos, n0, matches, copied = r.b, r.numbits, r.pos, len(out), 0, 0
         while True:
-            sym = self.decode_symbol(r, literal_length_tree)  # Recursionlimit
-            if sym <= 255:
+            if k < 32:
+                b |= int.from_bytes(mem[pos:pos + 4], "little") << k
+                pos += 4
+                k += 32
+                if pos > end:
+                    raise EOFError("End of deflate stream.")
+            e = literal_fast[b & 511]
+            if e:
+                b >>= e >> 9
+                k -= e >> 9
+                sym = e & 511
+            else:
+                r.b, r.numbits, r.pos = b, k, pos
+                sym = self.decode_symbol(r, literal_length_table)
+                b, k, pos = r.b, r.numbits, r.pos
+            if sym < 256:
                 out.append(sym)
-            elif sym == 256:
-                return
+                continue
+            if sym == 256:
+                break
+            sym -= 257
+            n = LENGTH_EXTRA[sym]
+            length = (b & ((1 << n) - 1)) + LENGTH_BASE[sym]
+            b >>= n
+            k -= n
+            if k < 32:
+                b |= int.from_bytes(mem[pos:pos + 4], "little") << k
+                pos += 4
+                k += 32
+                if pos > end:
+                    raise EOFError("End of deflate stream.")
+            e = distance_fast[b & 511]
+            if e:
+                b >>= e >> 9
+                k -= e >> 9
+                dist_sym = e & 511
+            else:
+                r.b, r.numbits, r.pos = b, k, pos
+                dist_sym = self.decode_symbol(r, distance_table)
+                b, k, pos = r.b, r.numbits, r.pos
+            n = DISTANCE_EXTRA[dist_sym]
+            dist = (b & ((1 << n) - 1)) + DISTANCE_BASE[dist_sym]
+            b >>= n
+            k -= n
+            start = len(out) - dist
+            if start < 0:
+                raise Exception("invalid distance")
+            matches, copied = matches + 1, copied + length
+            if self.limit is not None and len(out) + length > self.limit:  # Literals alone expand 8 times at most
+                if pos * 8 - k > len(mem) * 8:  # Decoded from the zero padding of a block cut short
+                    raise EOFError("End of deflate stream.")
+                raise OverflowError("Decompressed IDAT data exceeds the image size.")
+            if dist >= length:
+                out += out[start:start + length]
+            else:
+                out += (out[start:] * -(-length // dist))[:length]
+        r.b, r.numbits, r.pos = b, k, pos
+        self.symbols += len(out) - n0 - copied + matches + 1  # Literals, matches and the end of block
+
+
+FAST_BITS = 9
+LENGTH_EXTRA = [0] * 8 + [1] * 4 + [2] * 4 + [3] * 4 + [4] * 4 + [5] * 4 + [0]
+LENGTH_BASE = list(range(3, 11)) + [11, 13, 15, 17, 19, 23, 27, 31, 35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258]
+DISTANCE_EXTRA = 2 * [0] + [i for i in range(14) for _ in range(2)]
+DISTANCE_BASE = [1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193, 257, 385, 513, 769, 1025, 1537, 2049, 3073,
+                 4097, 6145, 8193, 12289, 16385, 24577]
+FIXED_LITERAL = BitReader.bl_list_to_table([8] * 144 + [9] * 112 + [7] * 24 + [8] * 8)
+FIXED_DISTANCE = BitReader.bl_list_to_table([5] * 30)
+
+
+class Inflater:
+    """
+    Incremental zlib decompressor carrying its state across IDAT chunks.
+    .. note::
+        Without the native zlib module of stripped Pyodide builds, BitReader decodes one whole block at a time
+        and a block cut short by the end of a chunk is decoded again once twice as much input is buffered.
+    """
+
+    def __init__(self, limit=None):
+        self.obj = decompressobj() if decompressobj else None
+        self.buf, self.window = bytearray(), bytearray()
+        self.header = self.eof = False
+        self.skip = self.wait = self.total = 0
+        self.limit = limit  # Of the whole output, enforced while BitReader decodes
+
+    def feed(self, data) -> bytes:
+        """
+        Decompresses as much as possible of the stream seen so far.
+        :rtype: bytes
+        """
+        if self.obj:
+            return self.obj.decompress(data)
+        self.buf += data
+        return self.inflate(False) if len(self.buf) >= self.wait else b""
+
+    def pieces(self, data, size: int = 1 << 16) -> Iterator[bytes]:
+        """
+        Output of feed() in pieces of at most size bytes with the native module, however much data expands.
+        """
+        if not self.obj:
+            yield self.feed(data)
+            return
+        while data:
+            yield self.obj.decompress(data, size)
+            data = self.obj.unconsumed_tail
+
+    def flush(self) -> bytes:
+        """
+        Decompresses the rest of the stream, which has to be complete.
+        :rtype: bytes
+        """
+        out = self.obj.flush() if self.obj else self.inflate(True)
+        if not (self.obj.eof if self.obj else self.eof):
+            raise EOFError("Deflate stream is truncated.")
+        return out
+
+    def inflate(self, final: bool) -> bytes:
+        w, n, br = self.window, len(self.window), BitReader()
+        br.limit = None if self.limit is None else n + self.limit - self.total
+        if not self.header:
+            if len(self.buf) < 2:
+                if final:
+                    raise EOFError("End of deflate stream.")
+                return b""
+            del self.buf[:2]
+            self.header = True
+        while not self.eof:
+            r, m = BitReader(bytes(self.buf)), len(w)
+            r.read_bits(self.skip)
+            try:
+                last = br.inflate_block(r, w)
+                if r.pos * 8 - r.numbits > len(self.buf) * 8:  # Decoded from the zero padding
+                    raise EOFError("End of deflate stream.")
+                self.eof = last
+            except OverflowError:  # Not a block cut short
+                raise
+            except Exception:
+                if final:
+                    raise
+                del w[m:]
+                self.wait = 2 * len(self.buf)
+                break
+            c = r.pos * 8 - r.numbits
+            del self.buf[:c >> 3]
+            self.skip, self.wait = c & 7, 0
+        out = bytes(w[n:])
+        self.total += len(out)
+        del w[:-32768]  # Farthest distance of a match
+        if PROFILER.enabled:
+            PROFILER.count("inflate", blocks=br.blocks, symbols=br.symbols)
+        return out
+
+
+class Pixels:
+    """
+    Compact image of interleaved samples in a single buffer, a row every stride samples.
+    .. note::
+        Samples are held in a bytearray up to 8 bits and in an array of unsigned shorts at 16 bits,
+        rows and pixels are memoryview slices of it rather than tuples.
+    """
+
+    def __init__(self, width: int, height: int, planes: int, bitdepth: int = 8, data=None):
+        self.width, self.height, self.planes, self.bitdepth = width, height, planes, bitdepth
+        self.stride = width * planes
+        if data is None:
+            data = array("H", bytes(2 * self.stride * height)) if bitdepth > 8 else bytearray(self.stride * height)
+        if len(data) != self.stride * height:
+            raise Exception(f"Expected {self.stride * height} samples, got {len(data)}.")
+        self.data, self.view = data, memoryview(data)
+
+    def __len__(self):
+        return self.height
+
+    def __iter__(self):
+        return (self.row(y) for y in range(self.height))
+
+    def row(self, y: int) -> memoryview:
+        return self.view[y * self.stride:(y + 1) * self.stride]
+
+    def pixel(self, x: int, y: int) -> memoryview:
+        k = y * self.stride + x * self.planes
+        return self.view[k:k + self.planes]
+
+    @classmethod
+    def from_rows(cls, width: int, height: int, planes: int, bitdepth: int, rows):
+        data = array("H") if bitdepth > 8 else bytearray()
+        for row in rows:
+            data.extend(row)
+        return cls(width, height, planes, bitdepth, data)
+
+
+def iter_composite(data=None, cols=None, lines=None, mode: str = "box"):
+    """
+    Width, height, planes and generator of the flat rows of 8-bit samples, decoded on demand and fitted to a
+    terminal of cols columns and lines lines.
+    """
+    return fit_composite(*ReaderPNG(file=data).as_direct(), cols, lines, mode)
+
+
+def fit_composite(w: int, h: int, pixel, info: dict, cols=None, lines=None, mode: str = "box"):
+    """
+    Same as iter_composite() from the output of ReaderPNG.as_direct().
+    .. note::
+        Lower depths are stretched to the full range, higher ones keep their most significant byte.
+    """
+    depth = info["bitdepth"]
+    if depth == 16:
+        pixel = (row.tobytes()[byteorder == "little"::2] for row in pixel)
+    elif depth > 8:
+        pixel = (bytes(v >> depth - 8 for v in row) for row in pixel)
+    elif depth < 8:
+        table = bytes(v * 255 // ((1 << depth) - 1) if v >> depth == 0 else 255 for v in range(256))
+        pixel = (row.translate(table) for row in pixel)
+    ow, oh = fit(w, h, cols, lines, mode)
+    return ow, oh, info["planes"], profiled_iter("resample", resample_iter(pixel, w, h, info["planes"], ow, oh, mode))
+
+
+def open_composite(data=None, cols=None, lines=None, mode: str = "box"):
+    if cols is None and lines is None:  # Full fidelity
+        w, h, pixel, info = ReaderPNG(file=data).as_direct()
+        return Pixels.from_rows(w, h, info["planes"], info["bitdepth"], pixel)
+    w, h, planes, pixel = iter_composite(data, cols, lines, mode)
+    return Pixels.from_rows(w, h, planes, 8, pixel)
+
+
+def fit(width: int, height: int, cols=None, lines=None, mode: str = "box") -> tuple:
+    """
+    Largest size within cols columns and lines lines of a terminal, with the same aspect ratio and never enlarged.
+    .. note::
+        A pixel takes two columns of a line, or one column of half a line in the half-block mode.
+    :rtype: tuple
+    """
+    half = mode == "half"
+    tw = width if cols is None else cols if half else cols // 2
+    th = height if lines is None else 2 * lines if half else lines
+    scale = min(1, tw / width, th / height)
+    if scale == 1:
+        return width, height
+    return max(1, min(tw, round(width * scale))), max(1, min(th, round(height * scale)))
+
+
+def resample_iter(rows, width: int, height: int, planes: int, ow: int, oh: int, mode: str = "box") -> Iterator:
+    """
+    Rows of 8-bit samples shrunk from width by height to ow by oh pixels, in a single pass over the source rows.
+    .. note::
+        The nearest mode keeps the source pixel at the center of each output pixel, the box and half-block modes
+        average all the source pixels it covers, holding a single row of sums.
+    """
+    if (ow, oh) == (width, height):
+        yield from rows
+        return
+    ends = [(j + 1) * height // oh for j in range(oh)]
+    if mode == "nearest":
+        pick = [(2 * i + 1) * width // (2 * ow) * planes + p for i in range(ow) for p in range(planes)]
+        centers = {(2 * j + 1) * height // (2 * oh) for j in range(oh)}
+        for y, row in enumerate(rows):
+            if y in centers:
+                yield bytes(map(row.__getitem__, pick))
+        return
+    starts = [i * width // ow for i in range(ow)]
+    spans = [b - a for a, b in zip(starts, starts[1:] + [width])]
+    j, n, acc, numpy = 0, 0, None, _numpy()
+    for y, row in enumerate(rows):
+        if numpy:
+            k = numpy.add.reduceat(numpy.frombuffer(row, numpy.uint8).reshape(width, planes), starts, axis=0,
+                                   dtype=numpy.uint32)
+            acc = k if acc is None else acc + k
+        else:
+            k = [sum(row[a * planes + p:(a + c) * planes:planes]) for a, c in zip(starts, spans) for p in range(planes)]
+            acc = k if acc is None else [u + v for u, v in zip(acc, k)]
+        n += 1
+        if y + 1 == ends[j]:
+            if numpy:
+                c = n * numpy.array(spans, numpy.uint32)[:, None]
+                yield ((acc + c // 2) // c).astype(numpy.uint8).tobytes()
+            else:
+                yield bytes((v + n * c // 2) // (n * c) for v, c in zip(acc, (c for c in spans for _ in range(planes))))
+            j, n, acc = j + 1, 0, None
+
+
+CUBE = (0, 0x5f, 0x87, 0xaf, 0xd7, 0xff)
+ESCAPES = tuple(f"\x1b[48;5;{i}m" for i in range(256))
+
+
+@lru_cache(2)
+def xterm_table(bits: int = 5) -> bytes:
+    """
+    Flat lookup table from RGB truncated to bits per channel to the nearest color of the xterm-256 6x6x6 cube
+    or greyscale ramp, the 16 system colors depending on the terminal theme.
+    :long_url: https://en.wikipedia.org/wiki/ANSI_escape_code#8-bit
+    :rtype: bytes
+    """
+    s, n = 8 - bits, 1 << bits
+    mid = [v << s | 1 << s >> 1 for v in range(n)]  # Center of each bucket
+    level = [min(range(6), key=lambda i: abs(CUBE[i] - v)) for v in mid]
+    out, k = bytearray(n ** 3), 0
+    for r, ir in zip(mid, level):
+        dr = (r - CUBE[ir]) ** 2
+        for g, ig in zip(mid, level):
+            dg = dr + (g - CUBE[ig]) ** 2
+            for b, ib in zip(mid, level):
+                gi = min(23, max(0, round(((r + g + b) / 3 - 8) / 10)))  # Closest grey to the mean
+                gv = 8 + 10 * gi
+                if (r - gv) ** 2 + (g - gv) ** 2 + (b - gv) ** 2 < dg + (b - CUBE[ib]) ** 2:
+                    out[k] = 232 + gi
+                else:
+                    out[k] = 16 + 36 * ir + 6 * ig + ib
+                k += 1
+    return bytes(out)
+
+
+def ansi_iter(rows, truecolor: bool = False, bits: int = 5, planes=None, half: bool = False) -> Iterator[str]:
+    """
+    Terminal rows of flat 8-bit sample rows, with a single escape for each run of a color.
+    .. note::
+        Channels are strided slices of each row, greyscale being repeated on the three of them and alpha ignored.
+        Half blocks draw two rows per line, the upper one as the foreground of U+2580 and the lower one behind it.
+    """
+    planes = getattr(rows, "planes", 3) if planes is None else planes
+    table, s = (None, 0) if truecolor else (xterm_table(bits), 8 - bits)
+
+    def colors(row):
+        r, g, b = (row[0::planes],) * 3 if planes < 3 else (row[0::planes], row[1::planes], row[2::planes])
+        if truecolor:
+            return zip(r, g, b)
+        return (table[(x >> s) << 2 * bits | (y >> s) << bits | z >> s] for x, y, z in zip(r, g, b))
+
+    if half:
+        sgr = (lambda k: "2;%d;%d;%d" % k) if truecolor else (lambda k: f"5;{k}")
+        rows = iter(rows)
+        for top in rows:
+            bottom = next(rows, None)  # Terminal background under the last row of an odd height
+            pairs = zip(colors(top), colors(bottom) if bottom is not None else repeat(None))
+            yield "".join(f"\x1b[38;{sgr(f)};{'49' if b is None else '48;' + sgr(b)}m{chr(0x2580) * sum(1 for _ in n)}"
+                          for (f, b), n in groupby(pairs)) + "\x1b[0m"
+        return
+    for row in rows:
+        if truecolor:
+            yield "".join(f"\x1b[48;2;{k[0]};{k[1]};{k[2]}m{'  ' * sum(1 for _ in n)}"
+                          for k, n in groupby(colors(row))) + "\x1b[0m"
+        else:
+            yield "".join(ESCAPES[k] + "  " * sum(1 for _ in n) for k, n in groupby(colors(row))) + "\x1b[0m"
+
+
+def start_iter(p=None, truecolor: bool = False, bits: int = 5, cols=None, lines=None,
+               mode: str = "box") -> Iterator[str]:
+    """
+    Terminal rows of a base64 PNG as soon as they are decoded, within cols columns and lines lines if given.
+    """
+    *_, planes, rows = iter_composite(__import__("base64").b64decode(p), cols, lines, mode)
+    yield from profiled_iter("ansi", ansi_iter(rows, truecolor, bits, planes, mode == "half"))
+
+
+@profiled("start", lambda res, p, *_, **__: {"bytes_in": len(p)})
+def start(p=None, truecolor: bool = False, bits: int = 5, cols=None, lines=None, mode: str = "box"):
+    return "\n".join(start_iter(p, truecolor, bits, cols, lines, mode))  # Transforming PNG into ANSI composite
+
+
+@profiled("preview")
+def preview(final=None, size: int = 35, truecolor: bool = False, bits: int = 5):
+    return "\n".join(ansi_iter(raster(final, size), truecolor, bits))  # Straight from the SVG bytes of make()
+
+
+def start_many(sources, truecolor: bool = False, bits: int = 5, cols=None, lines=None, mode: str = "box",
+               workers=None, chunk: int = 4) -> Iterator[tuple]:
+    """
+    Batch start() of PNG files given by their Path and of base64 PNGs, as (source, terminal composite) pairs in input
+    order, sharded by chunks of sources across worker processes.
+    .. note::
+        Workers receive the paths and read the files themselves, at most 2 chunks per worker are in flight. A source
+        that fails comes with its exception instead of a composite, without stopping the batch.
+    """
+    sources = iter(sources)
+    chunks = iter(lambda: list(islice(sources, chunk)), [])
+    return _pool_map(partial(start_chunk, truecolor=truecolor, bits=bits, cols=cols, lines=lines, mode=mode), chunks,
+                     workers)
+
+
+def start_chunk(sources: list, truecolor: bool = False, bits: int = 5, cols=None, lines=None,
+                mode: str = "box") -> list:
+    out = []
+    for source in sources:
+        try:
+            data = source.read_bytes() if isinstance(source, Path) else __import__("base64").b64decode(source)
+            *_, planes, rows = iter_composite(data, cols, lines, mode)
+            out.append((source, "\n".join(ansi_iter(rows, truecolor, bits, planes, mode == "half"))))
+        except Exception as e:  # Reported along with the source
+            out.append((source, e))
+    return out
+
+
+async def start_async(p=None, truecolor: bool = False, bits: int = 5, cols=None, lines=None, mode: str = "box",
+                      budget: float = 0.008, executor=None) -> str:
+    """
+    Same as start() from a coroutine, one terminal row at a time within the time slice, or in a pool of threads
+    or processes.
+    """
+    if executor is not None:
+        return await offload(start, p, truecolor, bits, cols, lines, mode, executor=executor)
+
+    def steps():  # Yields None for each slice of base64 text and each scanline decoded ahead of a terminal row
+        text, data = (p.encode() if isinstance(p, str) else bytes(p)).translate(None, b"\t\n\v\f\r "), bytearray()
+        for i in range(0, len(text), 1 << 20):
+            data += __import__("base64").b64decode(text[i:i + (1 << 20)])
+            yield None
+        w, h, pixel, info = ReaderPNG(file=data).as_direct()
+        queue, pixel = deque(), iter(pixel)
+        ow, oh, planes, rows = fit_composite(w, h, iter(lambda: queue.popleft() if queue else next(pixel, None), None),
+                                             info, cols, lines, mode)
+        ahead, out = -(-h // oh) * (1 + (mode == "half")), profiled_iter("ansi", ansi_iter(rows, truecolor, bits,
+                                                                                            planes, mode == "half"))
+        while True:
+            if len(queue) < ahead and (k := next(pixel, None)) is not None:
+                queue.append(k)
+                yield None
+            elif (line := next(out, None)) is not None:
+                yield line
             else:
-                sym -= 257
-                length = r.read_bits(([0] * 8 + [1] * 4 + [2] * 4 + [3] * 4 + [4] * 4 + [5] * 4 + [0])[sym]) + (list(range(3, 12)) + [13, 15, 17, 19, 23, 27, 31, 35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258])[sym]
-                dist_sym = self.decode_symbol(r, distance_tree)
-                dist = r.read_bits((2 * [0] + [i for i in range(14) for _ in range(2)])[dist_sym]) + [1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193, 257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145, 8193, 12289, 16385, 24577][dist_sym]
-                _ = [out.append(out[-dist]) for _ in range(length)]
-
-
-def open_composite(data=None):
-    w, _, pixel, info = ReaderPNG(file=data).as_direct()
-    png = []
-    for row in pixel:
-        n = iter(list(row)[:])
-        png += list(zip(n, n, n, n)) if info["alpha"] else list(zip(n, n, n))
-    return w, png
-
-
-def start(p=None):
-    m = open_composite(data=__import__("base64").b64decode(p))
-    x = ["\x00" * 3, "\x80\x00\x00", "\x00\x80\x00", "\x80\x80\x00", "\x00\x00\x80", "\x80\x00\x80",
-         "\x00\x80\x80", "À" * 3, "\x80" * 3, "ÿ\x00\x00", "\x00ÿ\x00", "ÿÿ\x00", "\x00\x00ÿ", "ÿ\x00ÿ",
-         "\x00ÿÿ", "ÿ" * 3, "\x00" * 3, "\x00\x00_", "\x00\x00\x87", "\x00\x00¯", "\x00\x00×",
-         "\x00\x00ÿ", "\x00_\x00", "\x00__", "\x00_\x87", "\x00_¯", "\x00_×", "\x00_ÿ", "\x00\x87\x00",
-         "\x00\x87_", "\x00\x87\x87", "\x00\x87¯", "\x00\x87×", "\x00\x87ÿ", "\x00¯\x00", "\x00¯_",
-         "\x00¯\x87", "\x00¯¯", "\x00¯×", "\x00¯ÿ", "\x00×\x00", "\x00×_", "\x00×\x87", "\x00×¯",
-         "\x00××", "\x00×ÿ", "\x00ÿ\x00", "\x00ÿ_", "\x00ÿ\x87", "\x00ÿ¯", "\x00ÿ×", "\x00ÿÿ",
-         "_\x00\x00", "_\x00_", "_\x00\x87", "_\x00¯", "_\x00×", "_\x00ÿ", "__\x00", "_" * 3, "__\x87",
-         "__¯", "__×", "__ÿ", "_\x87\x00", "_\x87_", "_\x87\x87", "_\x87¯", "_\x87×", "_\x87ÿ",
-         "_¯\x00", "_¯_", "_¯\x87", "_¯¯", "_¯×", "_¯ÿ", "_×\x00", "_×_", "_×\x87", "_×¯", "_××", "_×ÿ",
-         "_ÿ\x00", "_ÿ_", "_ÿ\x87", "_ÿ¯", "_ÿ×", "_ÿÿ", "\x87\x00\x00", "\x87\x00_", "\x87\x00\x87",
-         "\x87\x00¯", "\x87\x00×", "\x87\x00ÿ", "\x87_\x00", "\x87__", "\x87_\x87", "\x87_¯", "\x87_×",
-         "\x87_ÿ", "\x87\x87\x00", "\x87\x87_", "\x87" * 3, "\x87\x87¯", "\x87\x87×", "\x87\x87ÿ",
-         "\x87¯\x00", "\x87¯_", "\x87¯\x87", "\x87¯¯", "\x87¯×", "\x87¯ÿ", "\x87×\x00", "\x87×_",
-         "\x87×\x87", "\x87×¯", "\x87××", "\x87×ÿ", "\x87ÿ\x00", "\x87ÿ_", "\x87ÿ\x87", "\x87ÿ¯",
-         "\x87ÿ×", "\x87ÿÿ", "¯\x00\x00", "¯\x00_", "¯\x00\x87", "¯\x00¯", "¯\x00×", "¯\x00ÿ", "¯_\x00",
-         "¯__", "¯_\x87", "¯_¯", "¯_×", "¯_ÿ", "¯\x87\x00", "¯\x87_", "¯\x87\x87", "¯\x87¯", "¯\x87×",
-         "¯\x87ÿ", "¯¯\x00", "¯¯_", "¯¯\x87", "¯" * 3, "¯¯×", "¯¯ÿ", "¯×\x00", "¯×_", "¯×\x87", "¯×¯",
-         "¯××", "¯×ÿ", "¯ÿ\x00", "¯ÿ_", "¯ÿ\x87", "¯ÿ¯", "¯ÿ×", "¯ÿÿ", "×\x00\x00", "×\x00_",
-         "×\x00\x87", "×\x00¯", "×\x00×", "×\x00ÿ", "×_\x00", "×__", "×_\x87", "×_¯", "×_×", "×_ÿ",
-         "×\x87\x00", "×\x87_", "×\x87\x87", "×\x87¯", "×\x87×", "×\x87ÿ", "×¯\x00", "×¯_", "×¯\x87",
-         "×¯¯", "×¯×", "×¯ÿ", "××\x00", "××_", "××\x87", "××¯", "×" * 3, "××ÿ", "×ÿ\x00", "×ÿ_",
-         "×ÿ\x87", "×ÿ¯", "×ÿ×", "×ÿÿ", "ÿ\x00\x00", "ÿ\x00_", "ÿ\x00\x87", "ÿ\x00¯", "ÿ\x00×",
-         "ÿ\x00ÿ", "ÿ_\x00", "ÿ__", "ÿ_\x87", "ÿ_¯", "ÿ_×", "ÿ_ÿ", "ÿ\x87\x00", "ÿ\x87_", "ÿ\x87\x87",
-         "ÿ\x87¯", "ÿ\x87×", "ÿ\x87ÿ", "ÿ¯\x00", "ÿ¯_", "ÿ¯\x87", "ÿ¯¯", "ÿ¯×", "ÿ¯ÿ", "ÿ×\x00", "ÿ×_",
-         "ÿ×\x87", "ÿ×¯", "ÿ××", "ÿ×ÿ", "ÿÿ\x00", "ÿÿ_", "ÿÿ\x87", "ÿÿ¯", "ÿÿ×", "ÿ" * 3, "\x08" * 3,
-         "\x12" * 3, "\x1c" * 3, "&" * 3, "0" * 3, ":" * 3, "D" * 3, "N" * 3, "X" * 3, "b" * 3, "l" * 3,
-         "v" * 3, "\x80" * 3, "\x8a" * 3, "\x94" * 3, "\x9e" * 3, "¨" * 3, "²" * 3, "¼" * 3, "Æ" * 3,
-         "Ð" * 3, "Ú" * 3, "ä" * 3, "î" * 3]
-    L = list(zip(x, [k for k in [f"0{i}" if i < 10 else str(i) for i in range(256)]]))
-    res, s = ["00"] * 48 + ["5f"] * 67 + ["87"] * 40 + ["af"] * 40 + ["d7"] * 40 + ["ff"] * 21, []
-    _ = [[s.append("\x1b[0m\n") if (i + 1) % m[0] == 0 else 0 for _ in [s.append(
-        f'\x1b[48;5;{dict(L)["".join([chr(i) for i in tuple(int(f"{res[p[0]]}{res[p[1]]}{res[p[2]]}"[i:i + 2], 16) for i in (0, 2, 4))])]}m  ')]]
-         for i, p in enumerate(list(m[1]))]
-    return "".join(s).strip()  # Transforming PNG into RGB-alpha ANSI composite
+                return
+    return "\n".join([row async for row in cooperate(steps(), budget) if row is not None])
+
+
+async def cooperate(iterable, budget: float = 0.008) -> AsyncIterator:
+    """
+    Items of a blocking iterator, handing control back to the event loop each time a slice of budget seconds is spent.
+    .. note::
+        Each item is computed between two awaits, so that a cancelled task stops before the next one, and a slice
+        under a frame of 16 ms keeps the terminal responsive while a canvas is decoded.
+    """
+    sleep, deadline = __import__("asyncio").sleep, perf_counter() + budget
+    for item in iterable:
+        yield item
+        if perf_counter() >= deadline:
+            await sleep(0)
+            deadline = perf_counter() + budget
+
+
+async def offload(fn, *args, executor=None):
+    """
+    Result of a blocking call in an executor, the default pool of threads of the running loop if not given.
+    .. note::
+        A process pool only receives the arguments. A cancelled task stops waiting, while the call runs to its end.
+    """
+    return await __import__("asyncio").get_running_loop().run_in_executor(executor, partial(fn, *args))
+
+
+NUMBER = r"-?(?:\d+\.?\d*|\.\d+)"  # Adjacent decimals such as 10.5.5 as spelled by minify()
+
+
+@lru_cache(4096)
+def polygon(d: str) -> tuple:
+    """
+    Closed outline of a path data string, in the absolute M, L, H, V and relative l, h, v commands of the asset file.
+    :rtype: tuple
+    """
+    x = y = 0
+    pts = []
+    for c, args in findall(r"([MLHVZmlhvz])([^MLHVZmlhvz]*)", d):
+        v = [float(k) for k in findall(NUMBER, args)]
+        if c in "ML":
+            x, y = v[-2:]
+        elif c in "ml":
+            x, y = x + v[-2], y + v[-1]
+        elif c == "H":
+            x = v[-1]
+        elif c == "h":
+            x += v[-1]
+        elif c == "V":
+            y = v[-1]
+        elif c == "v":
+            y += v[-1]
+        else:
+            continue
+        pts.append((x, y))
+    return tuple(pts)
+
+
+@lru_cache(4096)
+def minify(d: str) -> str:
+    """
+    Shortest spelling of a path data string, its numbers separated only where a sign or a decimal point is not enough.
+    :rtype: str
+    """
+    out = []
+    for c, args in findall(r"([A-Za-z])([^A-Za-z]*)", d):
+        out.append(c)
+        for i, k in enumerate(findall(NUMBER, args)):
+            v = float(k)
+            k = str(int(v)) if v.is_integer() else repr(v).replace("0.", ".", 1) if abs(v) < 1 else repr(v)
+            if i and not k.startswith("-") and not (k.startswith(".") and "." in out[-1]):
+                out.append(" ")
+            out.append(k)
+    return "".join(out)
+
+
+def rasterize(shapes, size: int = 35) -> tuple:
+    """
+    Palette and indexed image of an avatar given by its (rgb, path data) pairs, sampled at the center of size by size
+    cells, without any browser.
+    .. note::
+        The sampling grid is symmetric about the center of the 320 by 320 canvas, so each <use> transform of the
+        group is an index mirroring of its single rasterization, painted in document order. Cells left uncovered
+        hold the index 255. Edges are filled under the nonzero rule with half-open spans, as for the crisp edges
+        of the canvas. Coordinates are scaled by size, so that the centers (2 * k + 1) * 160 are exact and ties
+        are broken alike.
+    :rtype: tuple
+    """
+    palette, grid = {}, [bytearray(b"\xff" * size) for _ in range(size)]
+    for rgb, d in shapes:
+        c, edges = palette.setdefault(rgb, len(palette)), []
+        for k in findall(r"M[^M]*", d):  # Subpaths of a merged path
+            pts = [(x * size, y * size) for x, y in polygon(k)]
+            edges += zip(pts, pts[1:] + pts[:1])
+        ys = [y for (_, y), _ in edges]
+        for i in range(max(0, -int((160 - min(ys)) // 320)), min(size, -int((160 - max(ys)) // 320))):
+            y, cross = (2 * i + 1) * 160, []
+            for (x0, y0), (x1, y1) in edges:
+                if (y0 <= y < y1) or (y1 <= y < y0):
+                    cross.append((x0 + (y - y0) * (x1 - x0) / (y1 - y0), 1 if y1 > y0 else -1))
+            cross.sort()
+            wind, row = 0, grid[i]
+            for (a, w), (b, _) in zip(cross, cross[1:]):
+                wind += w
+                if wind:  # Cells whose center lies in [a, b)
+                    j0, j1 = max(0, -int((160 - a) // 320)), min(size, -int((160 - b) // 320))
+                    row[j0:j1] = bytes([c]) * max(0, j1 - j0)
+    out, n = Pixels(size, size, 1, 8, bytearray(b"\xff" * size * size)), size - 1
+    flips = ((0, 0), (1, 0), (0, 1), (1, 1))  # Identity, vertical mirror, horizontal mirror and half-turn
+    if numpy := _numpy():
+        q, o = (numpy.frombuffer(k, numpy.uint8).reshape(size, size) for k in (b"".join(grid), out.data))
+        for fi, fj in flips:
+            v = q[::-1 if fi else 1, ::-1 if fj else 1]
+            numpy.copyto(o, v, where=v != 255)
+    else:
+        for fi, fj in flips:
+            for i, row in enumerate(grid):
+                k = (n - i if fi else i) * size
+                out.data[k:k + size] = bytes(t if s == 255 else s for s, t in zip(row[::-1] if fj else row,
+                                                                                  out.data[k:k + size]))
+    return list(palette), out
+
+
+@profiled("raster")
+def raster(final=None, size: int = 35) -> Pixels:
+    """
+    RGB image of an avatar over a black background, see rasterize().
+    :rtype: Pixels
+    """
+    final = make() if final is None else final
+    classes = dict(findall(rb"\.(\w+)\{fill:#(\w+)\}", final))
+    palette, index = rasterize([(bytes.fromhex((classes[value] if attr == b"class" else value).decode()), d.decode())
+                                for attr, value, d in findall(rb'<path (fill|class)="#?([^"]*)" d="([^"]*)"', final)],
+                               size)
+    out = Pixels(size, size, 3)
+    for c in range(3):
+        out.data[c::3] = index.data.translate(bytes(k[c] for k in palette).ljust(256, b"\0"))
+    return out
+
+
+class WriterPNG:
+    """This class provides methods to write indexed-color PNG thumbnails."""
+
+    COST = bytes(min(v, 256 - v) for v in range(256))  # Absolute value of a filtered byte taken as signed
+
+    def __init__(self, width: int, height: int, palette: list, level: int = 9, filter_type=0):
+        if filter_type not in (None, 0, 1, 2, 3, 4):
+            raise Exception(f"Invalid PNG filter type {filter_type}, expected None for adaptive or 0 to 4.")
+        self.width, self.height, self.palette = width, height, palette
+        self.bitdepth = next(d for d in (1, 2, 4, 8) if len(palette) <= 1 << d)
+        self.level, self.filter_type = level, filter_type
+        self.row_bytes = -(-width * self.bitdepth // 8)
+
+    def write(self, index) -> bytes:
+        """
+        PNG of an indexed image of a byte per pixel, at the lowest bit depth of its palette.
+        .. note::
+            Scanlines are filtered by filter_type, None for the filter type of least sum of absolute differences on
+            each of them. No filter is the recommendation for indexed-color images, and the smallest at 35 pixels.
+        :long_url: https://www.w3.org/TR/png/#12Filter-selection
+        :rtype: bytes
+        """
+        if numpy := _numpy():
+            raw = self.filter_image(numpy.frombuffer(b"".join(self.pack(index)), numpy.uint8).reshape(self.height, -1))
+        else:
+            raw, previous = bytearray(), bytes(self.row_bytes)
+            for line in map(bytes, self.pack(index)):
+                if self.filter_type is None:
+                    flt, out = min(((k, self.filter_scanline(k, line, previous)) for k in range(5)),
+                                   key=lambda f: sum(f[1].translate(self.COST)))
+                else:
+                    flt, out = self.filter_type, self.filter_scanline(self.filter_type, line, previous)
+                raw.append(flt)
+                raw += out
+                previous = line
+        return b"".join((b"\x89PNG\r\n\x1a\n",
+                         self.chunk(b"IHDR", pack(">2I5B", self.width, self.height, self.bitdepth, 3, 0, 0, 0)),
+                         self.chunk(b"PLTE", b"".join(self.palette)),
+                         self.chunk(b"IDAT", self.deflate(raw, self.level)), self.chunk(b"IEND", b"")))
+
+    def pack(self, index) -> Iterator[bytes]:
+        """
+        Scanlines of the indexed image, packed most significant bits first.
+        """
+        d, w = self.bitdepth, self.width
+        if d == 8:
+            yield from map(bytes, index)
+            return
+        per = 8 // d
+        if numpy := _numpy():
+            a = numpy.zeros((self.height, self.row_bytes * per), numpy.uint8)
+            a[:, :w] = numpy.frombuffer(index.data, numpy.uint8).reshape(self.height, w)
+            shifts = numpy.arange(8 - d, -1, -d, dtype=numpy.uint8)
+            yield from (a.reshape(self.height, self.row_bytes, per) << shifts).sum(2, numpy.uint8)
+            return
+        for row in index:
+            v = 0
+            for x in row:
+                v = v << d | x
+            yield (v << d * (-w % per)).to_bytes(self.row_bytes, "big")
+
+    def filter_image(self, a) -> bytes:
+        """
+        Filtered scanlines of a 2D array of packed rows with their filter type bytes, as chosen by write().
+        :rtype: bytes
+        """
+        numpy = _numpy()
+        x = a.astype(numpy.int16)
+        b = numpy.zeros_like(x)
+        b[1:] = x[:-1]
+        left, c = numpy.zeros_like(x), numpy.zeros_like(x)
+        left[:, 1:], c[:, 1:] = x[:, :-1], b[:, :-1]
+        p = left + b - c
+        pa, pb, pc = abs(p - left), abs(p - b), abs(p - c)
+        paeth = numpy.where((pa <= pb) & (pa <= pc), left, numpy.where(pb <= pc, b, c))
+        out = numpy.stack((x, x - left, x - b, x - (left + b >> 1), x - paeth)).astype(numpy.uint8)
+        if self.filter_type is None:
+            flt = numpy.frombuffer(self.COST, numpy.uint8)[out].sum(2, numpy.int64).argmin(0)
+        else:
+            flt = numpy.full(self.height, self.filter_type)
+        rows = out[flt, numpy.arange(self.height)]
+        return numpy.concatenate((flt.astype(numpy.uint8)[:, None], rows), 1).tobytes()
+
+    @staticmethod
+    def filter_scanline(flt, line, previous) -> bytes:
+        """
+        Filtered scanline of a filter unit of a byte, the inverse of the ReaderPNG.undo_filter_* methods.
+        :rtype: bytes
+        """
+        line, previous = bytes(line), bytes(previous)
+        left = b"\0" + line[:-1]
+        if flt == 0:
+            return line
+        if flt == 1:
+            return bytes((x - a) & 0xff for x, a in zip(line, left))
+        if flt == 2:
+            return bytes((x - b) & 0xff for x, b in zip(line, previous))
+        if flt == 3:
+            return bytes((x - (a + b >> 1)) & 0xff for x, a, b in zip(line, left, previous))
+        out = bytearray()
+        for x, a, b, c in zip(line, left, previous, b"\0" + previous[:-1]):
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            out.append((x - (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xff)
+        return bytes(out)
+
+    @staticmethod
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return pack(">I", len(data)) + tag + data + pack(">I", checksum(data, checksum(tag)))
+
+    @staticmethod
+    def deflate(data, level: int = 9) -> bytes:
+        """
+        Zlib stream of data, in stored blocks without the native zlib module.
+        :rtype: bytes
+        """
+        if compress:
+            return compress(bytes(data), level)
+        out, a, b = bytearray(b"\x78\x01"), 1, 0
+        for k in range(0, len(data), 0xffff):
+            block = data[k:k + 0xffff]
+            out += bytes([k + 0xffff >= len(data)]) + pack("<2H", len(block), len(block) ^ 0xffff) + block
+        for k in range(0, len(data), 5552):  # Largest run without overflow of the Adler-32 sums
+            for x in data[k:k + 5552]:
+                a += x
+                b += a
+            a, b = a % 65521, b % 65521
+        return bytes(out + pack(">I", b << 16 | a)) if data else bytes(out + b"\x01\x00\x00\xff\xff" + pack(">I", 1))
+
+
+@profiled("png")
+def make_png(size: int = 35, legacy: bool = False, seed=None, level: int = 9, filter_type=0) -> bytes:
+    """
+    Indexed-color PNG thumbnail of size by size pixels of an avatar, as drawn by make() for the same seed.
+    .. note::
+        Cells left uncovered are black as in raster(). A handful of colors fit a bit depth of 2 or 4.
+    :rtype: bytes
+    """
+    _, paths, fills = draw(legacy, random if seed is None else random.Random(seed))
+    palette, index = rasterize([(bytes.fromhex(f[1:]), d) for f, d in zip(fills, paths)], size)
+    if 255 in index.data:
+        index.data[:] = index.data.translate(bytes(range(255)) + bytes([len(palette)]))
+        palette.append(b"\0\0\0")
+    return WriterPNG(size, size, palette, level, filter_type).write(index)
 
 
 if __name__ == "__main__":
-    _ = (print(demo(_)) if (_ := make()) else _)
+    from argparse import ArgumentParser
+    from os.path import commonpath
+    from sys import stderr, stdin
+    parser = ArgumentParser(description="SVG of a random avatar, or terminal composites of PNG files in input order.")
+    parser.add_argument("sources", nargs="*", metavar="PNG", help="PNG files, - for base64 PNGs a line each from stdin")
+    parser.add_argument("-o", "--output", metavar="DIR", help="write each composite to DIR/PATH.ans, not to stdout")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes, as many as CPUs by default")
+    parser.add_argument("--cols", type=int, help="fit within COLS columns")
+    parser.add_argument("--lines", type=int, help="fit within LINES lines")
+    parser.add_argument("--mode", choices=("box", "nearest", "half"), default="box", help="resampling mode")
+    parser.add_argument("--truecolor", action="store_true", help="24-bit colors instead of the xterm palette")
+    parser.add_argument("--bits", type=int, default=5, choices=range(1, 8),
+                        help="bits per channel of the xterm color lookup")
+    args = parser.parse_args()
+    if not args.sources:
+        _ = (print(demo(_)) if (_ := make()) else _)
+    else:
+        files = [Path(a).resolve() for a in args.sources if a != "-"]
+        root = Path(commonpath([p.parent for p in files])) if files else None  # Same names apart in their folders
+        failed = 0
+        for k, (source, res) in enumerate(start_many(
+                (p for a in args.sources for p in (filter(None, map(str.strip, stdin)) if a == "-" else [Path(a)])),
+                args.truecolor, args.bits, args.cols, args.lines, args.mode, args.workers)):
+            name = str(source.resolve().relative_to(root)) if isinstance(source, Path) else f"stdin-{k}"
+            if isinstance(res, Exception):
+                failed += 1
+                print(f"{name}: {type(res).__name__}: {res}", file=stderr)
+            elif args.output:
+                (out := Path(args.output) / f"{name}.ans").parent.mkdir(parents=True, exist_ok=True)
+                out.write_text(res + "\n")
+            else:
+                print(res)
+        raise SystemExit(1 if failed else 0)
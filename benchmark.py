@@ -0,0 +1,273 @@
+"""
+This module provides a reproducible benchmark suite of the aesthetic pipeline, written out as JSON.
+"""
+
+from argparse import ArgumentParser
+from base64 import b64encode
+from json import dumps
+from platform import platform, python_implementation, python_version
+from random import Random
+from statistics import median, quantiles
+from struct import pack
+from subprocess import run
+from sys import executable, path, stderr
+from pathlib import Path
+from time import perf_counter
+from tracemalloc import get_traced_memory, start, stop
+from zlib import compress, compressobj, crc32, Z_DEFAULT_STRATEGY, Z_FIXED, Z_RLE
+
+path.insert(0, str(Path(__file__).parent / "assets"))
+import aesthetic  # noqa: E402
+from aesthetic import ADAM7, ReaderPNG, Scalable  # noqa: E402
+
+
+def best(fn, *args, repeat: int = 5) -> float:
+    """
+    Best wall time of a few runs, the least disturbed by the rest of the system.
+    :rtype: float
+    """
+    t = []
+    for _ in range(repeat):
+        s = perf_counter()
+        fn(*args)
+        t.append(perf_counter() - s)
+    return min(t)
+
+
+def measure(fn, *args, repeat: int = 20, number: int = 1) -> dict:
+    """
+    Median and 95th percentile of the wall time of number calls, then the peak of a traced run.
+    .. note::
+        Memory is traced on a separate run, so that tracemalloc does not slow down the timed ones.
+    :rtype: dict
+    """
+    fn(*args)  # Warm-up
+    t = []
+    for _ in range(repeat):
+        s = perf_counter()
+        for _ in range(number):
+            fn(*args)
+        t.append((perf_counter() - s) / number)
+    start()
+    fn(*args)
+    peak = get_traced_memory()[1]
+    stop()
+    return {"median_ms": median(t) * 1e3, "p95_ms": quantiles(t, n=20)[18] * 1e3 if len(t) > 1 else t[0] * 1e3,
+            "min_ms": min(t) * 1e3, "peak_kib": peak / 1024}
+
+
+def corpus(seed: int = 0) -> dict:
+    """
+    Deflate streams of avatar-like scanlines, flat runs and noisy bytes, with fixed and dynamic blocks.
+    :rtype: dict
+    """
+    rnd = Random(seed)
+    rows = b"".join(bytes([rnd.randrange(5)]) + bytes(rnd.choice(b"\x00\x10\x7f\xff") for _ in range(140))
+                    for _ in range(320))
+    flat = bytes(rnd.randrange(4) for _ in range(512)) * 512
+    noise = bytes(rnd.randrange(64) for _ in range(1 << 18))
+    out = {}
+    for name, raw in (("rows", rows), ("flat", flat), ("noise", noise)):
+        for label, strategy in (("dynamic", Z_DEFAULT_STRATEGY), ("fixed", Z_FIXED), ("rle", Z_RLE)):
+            c = compressobj(9, 8, 15, 9, strategy)
+            out[f"{name}/{label}"] = raw, c.compress(raw) + c.flush()
+        out[f"{name}/stored"] = raw, compress(raw, 0)
+    return out
+
+
+def png(width: int, height: int, color_type: int, bitdepth: int, interlace: int = 0, seed: int = 0) -> bytes:
+    """
+    PNG of random samples and random filter types, with a full palette for the color type 3.
+    :rtype: bytes
+    """
+    rnd = Random(seed)
+    bits = bitdepth * {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    passes = [(xs, ys, dx, dy) for xs, ys, dx, dy in ADAM7 if xs < width and ys < height] if interlace \
+        else [(0, 0, 1, 1)]
+    raw = bytearray()
+    for xs, ys, dx, dy in passes:
+        n = -(-(-(-(width - xs) // dx)) * bits // 8)
+        for _ in range(ys, height, dy):
+            raw.append(rnd.randrange(5))
+            raw += rnd.randbytes(n)
+
+    def chunk(tag, data):
+        return pack(">I", len(data)) + tag + data + pack(">I", crc32(tag + data))
+    out = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", pack(">2I5B", width, height, bitdepth, color_type, 0, 0, interlace))
+    if color_type == 3:
+        out += chunk(b"PLTE", rnd.randbytes(3 << bitdepth))
+    return out + chunk(b"IDAT", compress(bytes(raw), 6)) + chunk(b"IEND", b"")
+
+
+def avatar(size: int = 320, seed: int = 1) -> bytes:
+    """
+    Canvas-like RGBA export of an avatar of 5 colors in 40 pixel tiles, the input of start().
+    :rtype: bytes
+    """
+    rnd = Random(seed)
+    cols = [rnd.randbytes(3) + b"\xff" for _ in range(5)]
+    raw = b"".join(b"\x00" + b"".join(cols[(x // 40 + y // 40) % 5] for x in range(size)) for y in range(size))
+
+    def chunk(tag, data):
+        return pack(">I", len(data)) + tag + data + pack(">I", crc32(tag + data))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", pack(">2I5B", size, size, 8, 6, 0, 0, 0)) + \
+        chunk(b"IDAT", compress(raw, 6)) + chunk(b"IEND", b"")
+
+
+def bench_import(repeat: int = 5) -> dict:
+    """
+    Import latency, cold first make() and peak RSS of a fresh interpreter, before and after the assets are loaded.
+    :rtype: dict
+    """
+    code = ("import resource, time; t = time.perf_counter(); import aesthetic; t = time.perf_counter() - t; "
+            "r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; m = time.perf_counter(); aesthetic.make(); "
+            "print(t, r, time.perf_counter() - m, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    runs = [list(map(float, run([executable, "-c", code], cwd=Path(__file__).parent / "assets", capture_output=True,
+                                text=True, check=True).stdout.split())) for _ in range(repeat)]
+    t, before, first, after = (sorted(k)[len(k) // 2] for k in zip(*runs))
+    return {"import_ms": t * 1e3, "rss_import_mib": before / 1024, "make_cold_ms": first * 1e3,
+            "rss_make_mib": after / 1024}
+
+
+def bench_make() -> dict:
+    """
+    Avatar generation from fresh seeds and warm from the render cache, with its building blocks.
+    .. note::
+        The assets are loaded beforehand, the first make() of a fresh interpreter is timed by bench_import.
+    :rtype: dict
+    """
+    seeds = iter(range(1 << 62))
+    aesthetic.make(seed=0)
+    return {"make/unseeded": measure(aesthetic.make, number=20),
+            "make/fresh-seed": measure(lambda: aesthetic.make(seed=next(seeds)), number=20),
+            "make/warm": measure(aesthetic.make, False, 0, number=200),
+            "scalable": measure(Scalable, number=100),
+            "accelerate_asc/32": measure(lambda: sum(1 for _ in Scalable.accelerate_asc(32)), repeat=10)}
+
+
+def bench_unfilter(widths: tuple = (320, 1024, 4096), planes: int = 4, rows: int = 64) -> dict:
+    """
+    Timings of each ReaderPNG.undo_filter_* method over rows of RGBA scanlines of a few widths.
+    :rtype: dict
+    """
+    rnd, res = Random(1), {}
+    for width in widths:
+        n = width * planes
+        lines = [bytearray(rnd.randrange(256) for _ in range(n)) for _ in range(rows)]
+        for name in ("sub", "up", "average", "paeth"):
+            fn = getattr(ReaderPNG, f"undo_filter_{name}")
+
+            def run():
+                previous = bytearray(n)
+                for line in lines:
+                    result = bytearray(line)
+                    fn(planes, result, previous, result)
+                    previous = result
+
+            res[f"unfilter/{name}/{width}"] = m = measure(run, repeat=5)
+            m["rows_per_s"] = rows / m["median_ms"] * 1e3
+    return res
+
+
+def bench_inflate() -> dict:
+    """
+    Decode throughput in MB/s of BitReader.inflate and zlib.decompress on the same streams.
+    :rtype: dict
+    """
+    from zlib import decompress
+    res = {}
+    for name, (raw, z) in corpus().items():
+        if ReaderPNG.dec(z) != raw:
+            raise Exception(f"{name} does not round-trip.")
+        res[f"inflate/{name}"] = m = measure(ReaderPNG.dec, z, repeat=5)
+        m["mb_per_s"] = len(raw) / m["median_ms"] / 1e3
+        m["zlib_mb_per_s"] = len(raw) / best(decompress, z) / 1e6
+    return res
+
+
+def bench_decode() -> dict:
+    """
+    ReaderPNG.as_direct over every color type and bit depth at two sizes, plain and Adam7 interlaced.
+    :rtype: dict
+    """
+    res = {}
+    for color_type, depths in ((0, (1, 2, 4, 8, 16)), (2, (8, 16)), (3, (1, 2, 4, 8)), (4, (8, 16)), (6, (8, 16))):
+        for bitdepth in depths:
+            for size in (35, 320):
+                for interlace in (0, 1):
+                    data = png(size, size, color_type, bitdepth, interlace)
+                    res[f"decode/{color_type}/{bitdepth}/{size}{'/adam7' if interlace else ''}"] = measure(
+                        lambda: sum(1 for _ in ReaderPNG(data).as_direct()[2]), repeat=5 if size > 35 else 20)
+    return res
+
+
+def bench_start() -> dict:
+    """
+    End to end start() of a base64 canvas export, at full size and within an 80 by 40 terminal.
+    :rtype: dict
+    """
+    p = b64encode(avatar())
+    res = {"start/full": measure(aesthetic.start, p, repeat=5),
+           "start/truecolor": measure(aesthetic.start, p, True, repeat=5)}
+    for mode in ("nearest", "box", "half"):
+        res[f"start/80x40/{mode}"] = measure(lambda: aesthetic.start(p, cols=80, lines=40, mode=mode))
+    res["preview/35"] = measure(aesthetic.preview, aesthetic.make(seed=1), 35)
+    return res
+
+
+def bench_png() -> dict:
+    """
+    Thumbnails per second of make_png at a few sizes, by adaptive and fixed scanline filters, and the PNG sizes.
+    :rtype: dict
+    """
+    res = {}
+    for size in (35, 64, 320):
+        for name, filter_type in (("none", 0), ("adaptive", None), ("paeth", 4)):
+            seeds = iter(range(1 << 62))
+            res[f"png/{size}/{name}"] = m = measure(
+                lambda: aesthetic.make_png(size, seed=next(seeds), filter_type=filter_type), repeat=10,
+                number=5 if size > 64 else 20)
+            m["thumbs_per_s"] = 1e3 / m["median_ms"]
+            m["bytes"] = median(len(aesthetic.make_png(size, seed=k, filter_type=filter_type)) for k in range(20))
+    return res
+
+
+def bench_batch(n: int = 400) -> dict:
+    """
+    Files per second of start_many over make_png thumbnails, in process and across every CPU.
+    :rtype: dict
+    """
+    from os import cpu_count
+    from tempfile import TemporaryDirectory
+    res = {}
+    with TemporaryDirectory() as tmp:
+        files = [Path(tmp) / f"{k}.png" for k in range(n)]
+        for k, file in enumerate(files):
+            file.write_bytes(aesthetic.make_png(64, seed=k))
+        for workers in sorted({1, cpu_count() or 1}):
+            res[f"batch/{workers}"] = m = measure(
+                lambda: sum(1 for _ in aesthetic.start_many(files, cols=40, workers=workers)), repeat=3)
+            m["files_per_s"] = n / m["median_ms"] * 1e3
+    return res
+
+
+SUITES = {"make": bench_make, "inflate": bench_inflate, "unfilter": bench_unfilter, "decode": bench_decode,
+          "start": bench_start, "png": bench_png, "batch": bench_batch, "import": bench_import}
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.strip())
+    parser.add_argument("suites", nargs="*", metavar="SUITE", help=f"any of {', '.join(SUITES)}, all by default")
+    parser.add_argument("--json", metavar="FILE", help="write the results to FILE, - for the standard output")
+    args = parser.parse_args()
+    results = {}
+    for suite in args.suites or SUITES:
+        res = SUITES[suite]()
+        results.update({"import": res} if suite == "import" else res)
+    for k, v in results.items():  # Kept off the standard output of --json -
+        print(f"{k:<28}" + "".join(f"{x:>12.2f} {u}" for u, x in v.items()), file=stderr if args.json == "-" else None)
+    if args.json:
+        out = dumps({"python": f"{python_implementation()} {python_version()}", "platform": platform(),
+                     "numpy": aesthetic._numpy() is not None, "zlib": aesthetic.decompressobj is not None,
+                     "results": results}, indent=2)
+        print(out) if args.json == "-" else Path(args.json).write_text(out + "\n")
@@ -69,7 +69,7 @@ const commands = {
         f: () => {
             if (self.pyodide) {
                 if (self.dataURL) {
-                    self.term.runPythonCode(`svg = asc.start("${self.dataURL?.replace('data:image/png;base64,', '')}"); svg`).then(null);
+                    self.term.runPythonCode(`for svg in asc.ansi_iter(asc.raster(img, 35)): print(svg); await __import__("asyncio").sleep(0)`).then(null); // Row by row, without the PNG round-trip
                     if (self.img?.src) {
                         let img = self.img.src;
                         self.term.registerLinkProvider(new LinkProvider(term, new RegExp(`(${img})`, "gu"), (_, __) => {
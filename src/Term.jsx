@@ -72,23 +72,23 @@ export async function generation() {
     self.svg = await self.pyodide.runPythonAsync(`
         from hashlib import blake2b; from importlib import util; from js import fetch
         from os import _exit; from pathlib import Path; from sys import modules
-        modules["antigravity"] = None; fbz, apy = Path("/home/pyodide/final.bz2"), Path("/home/pyodide/aesthetic.py")
-        if not fbz.exists():
-          final = (await (await fetch("/sissel/assets/final.bz2")).arrayBuffer()).to_py()
-          if blake2b(final).hexdigest() == "54b6213e47effb93aa6aeddeef8f3a1281b3e4be2c86d5c76021be36bbd7a2800a8731494b380c605c81696f6916d6a7cbc5cbe51e51fbc8965a42e4b2291319": fbz.write_bytes(final)
+        modules["antigravity"] = None; fbn, apy = Path("/home/pyodide/final.bin"), Path("/home/pyodide/aesthetic.py")
+        if not fbn.exists():
+          final = (await (await fetch("/sissel/assets/final.bin")).arrayBuffer()).to_py()
+          if blake2b(final).hexdigest() == "670f3fac3bde2e09b5c8215876453e9b075b30c3664f62960348de13880b8a9b65db5de158f1d82d259e759dec93247345420de62291ac9e4e3b687a1c09c506": fbn.write_bytes(final)
           else: del final
-        elif blake2b(fbz.read_bytes()).hexdigest() != "54b6213e47effb93aa6aeddeef8f3a1281b3e4be2c86d5c76021be36bbd7a2800a8731494b380c605c81696f6916d6a7cbc5cbe51e51fbc8965a42e4b2291319": _exit(0)
+        elif blake2b(fbn.read_bytes()).hexdigest() != "670f3fac3bde2e09b5c8215876453e9b075b30c3664f62960348de13880b8a9b65db5de158f1d82d259e759dec93247345420de62291ac9e4e3b687a1c09c506": _exit(0)
         if not apy.exists():  # FileNotFoundError
           ast   = (await (await fetch("/sissel/assets/aesthetic.py")).arrayBuffer()).to_py()  
-          if blake2b(ast).hexdigest() == "77f62cf6166c5696ce35aeb910aa75ed1a9e7371fdf7e4253aa7fb3010e91395f154d6adca12688ab23bcbbdfa82d95d8b34daca0fb3ec85c7310c73d9b5c0da": apy.write_bytes(ast)
+          if blake2b(ast).hexdigest() == "fa0b12d44cb465dfdcc3d830f586019ca90a9670940b908440dd2d5b237b6c0d5703d73f121c2c7a744682d41397233165445132694acaea97bbb178b05ca8c6": apy.write_bytes(ast)
           else: del apy
-        elif blake2b(apy.read_bytes()).hexdigest() != "77f62cf6166c5696ce35aeb910aa75ed1a9e7371fdf7e4253aa7fb3010e91395f154d6adca12688ab23bcbbdfa82d95d8b34daca0fb3ec85c7310c73d9b5c0da": _exit(0)
+        elif blake2b(apy.read_bytes()).hexdigest() != "fa0b12d44cb465dfdcc3d830f586019ca90a9670940b908440dd2d5b237b6c0d5703d73f121c2c7a744682d41397233165445132694acaea97bbb178b05ca8c6": _exit(0)
         if not modules.get("aesthetic"):
           spec  = util.spec_from_file_location("aesthetic", "/home/pyodide/aesthetic.py")
           asc   = util.module_from_spec(spec)
           spec.loader.exec_module(asc)
           modules["aesthetic"] = asc
-        asc.demo((img := asc.make())); img.decode()
+        asc.demo((img := await asc.make_async(mode="merged"))); img.decode()
     `);
     if (self.svg) {
         self.img = new Image(320, 320);
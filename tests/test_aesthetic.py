@@ -0,0 +1,176 @@
+"""
+Regression tests of the aesthetic module, run with python -m pytest from the repository root.
+"""
+
+from io import BytesIO, RawIOBase
+from pathlib import Path
+from struct import pack
+from sys import path
+from tracemalloc import get_traced_memory, start, stop
+from zlib import DEFLATED, Z_FIXED, compress, compressobj, crc32
+
+import pytest
+
+path.insert(0, str(Path(__file__).parent.parent / "assets"))
+import aesthetic  # noqa: E402
+
+
+def chunk(tag: bytes, data: bytes) -> bytes:
+    return pack(">I", len(data)) + tag + data + pack(">I", crc32(tag + data))
+
+
+@pytest.fixture
+def pure(monkeypatch):
+    monkeypatch.setattr(aesthetic, "decompressobj", None)
+
+
+@pytest.mark.parametrize("size", [1, 7, 8, 64])
+def test_inflate_split_feeds(pure, size):
+    raw = b"\x01" * 1000
+    z = compress(raw, 1)
+    inflater = aesthetic.Inflater()
+    out = b"".join(inflater.feed(z[k:k + size]) for k in range(0, len(z), size)) + inflater.flush()
+    assert out == raw
+
+
+def test_png_split_idat(pure):
+    rows = [bytes(v for x in range(16) for v in (x * 16, y * 16, x ^ y)) for y in range(16)]
+    z = compress(b"".join(b"\x00" + row for row in rows), 6)
+    data = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", pack(">2I5B", 16, 16, 8, 2, 0, 0, 0)) + \
+        b"".join(chunk(b"IDAT", z[k:k + 8]) for k in range(0, len(z), 8)) + chunk(b"IEND", b"")
+    w, h, pixels, _ = aesthetic.ReaderPNG(data).as_direct()
+    assert (w, h) == (16, 16)
+    assert [bytes(row) for row in pixels] == rows
+
+
+
+def test_inflate_bomb(pure):
+    c = compressobj(9, DEFLATED, 15, 9, Z_FIXED)
+    z = c.compress(bytes(64 << 20)) + c.flush()
+    data = b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", pack(">2I5B", 100, 100, 8, 2, 0, 0, 0)) + chunk(b"IDAT", z) + \
+        chunk(b"IEND", b"")
+    start()
+    try:
+        with pytest.raises(Exception, match="exceeds the image size"):
+            sum(1 for _ in aesthetic.ReaderPNG(data).as_direct()[2])
+        assert get_traced_memory()[1] < 16 << 20
+    finally:
+        stop()
+
+class ShortReads(RawIOBase):
+    def __init__(self, data: bytes):
+        self.data = BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        return self.data.read(3 if n < 0 else min(n, 3))
+
+
+def test_stream_short_reads():
+    data = aesthetic.make_png(64, seed=3)
+    rows = [bytes(row) for row in aesthetic.ReaderPNG(data).as_direct()[2]]
+    assert [bytes(row) for row in aesthetic.ReaderPNG(ShortReads(data)).as_direct()[2]] == rows
+
+
+@pytest.mark.parametrize("native", [True, False])
+def test_truncated_png(monkeypatch, native):
+    if not native:
+        monkeypatch.setattr(aesthetic, "decompressobj", None)
+    png, k, chunks = aesthetic.make_png(64, seed=3), 8, []
+    while k < len(png):
+        n = int.from_bytes(png[k:k + 4], "big")
+        tag, data = png[k + 4:k + 8], png[k + 8:k + 8 + n]
+        chunks += [chunk(tag, data[i:i + 64]) for i in range(0, n, 64)] if tag == b"IDAT" else [chunk(tag, data)]
+        k += 12 + n
+    for cut in range(1, len(chunks) - 1):  # At the end of each chunk, from the IHDR one to short of the IEND one
+        data = png[:8] + b"".join(chunks[:cut])
+        for source in (data, BytesIO(data)):
+            with pytest.raises(Exception):
+                sum(1 for _ in aesthetic.ReaderPNG(source).as_direct()[2])
+
+
+def test_minify_fractions():
+    d = "M10.5 0.5L-0.5 -1.25L100.05 -20.5z"
+    assert aesthetic.minify(d) == "M10.5.5L-.5-1.25L100.05-20.5z"
+    assert aesthetic.polygon(aesthetic.minify(d)) == aesthetic.polygon(d) == ((10.5, .5), (-.5, -1.25), (100.05, -20.5))
+    svg = aesthetic.serialize(["M10.5 0.5L200.25 0.5L200.25 130.5z"], ["#ff0000"], "merged")
+    spaced = svg.replace(b"M10.5.5", b"M10.5 0.5")
+    assert bytes(aesthetic.raster(svg, 64).data) == bytes(aesthetic.raster(spaced, 64).data)
+
+
+@pytest.mark.parametrize("colors", [2, 5, 16, 40, 256])
+@pytest.mark.parametrize("filter_type", [None, 0, 1, 2, 3, 4])
+@pytest.mark.parametrize("accelerated", [True, False])
+def test_writer_round_trip(monkeypatch, colors, filter_type, accelerated):
+    if not accelerated:
+        monkeypatch.setattr(aesthetic, "_numpy", lambda: None)
+    palette = [bytes((k, 255 - k, k * 7 % 256)) for k in range(colors)]
+    index = aesthetic.Pixels(37, 23, 1, 8, bytearray((x * y + x) % colors for y in range(23) for x in range(37)))
+    data = aesthetic.WriterPNG(37, 23, palette, 9, filter_type).write(index)
+    w, h, pixels, info = aesthetic.ReaderPNG(data).as_direct()
+    assert (w, h) == (37, 23)
+    assert b"".join(bytes(row) for row in pixels) == b"".join(palette[k] for k in index.data)
+
+
+def test_phys():
+    png = aesthetic.make_png(35, seed=1)
+    data = png[:33] + chunk(b"pHYs", pack(">2IB", 2835, 3780, 1)) + png[33:]
+    reader = aesthetic.ReaderPNG(data)
+    reader.preamble()
+    assert (reader.x_pixels_per_unit, reader.y_pixels_per_unit, reader.unit_is_meter) == (2835, 3780, True)
+
+
+def encode(width: int, height: int, color_type: int, bitdepth: int, interlace: int, samples: list) -> bytes:
+    """
+    PNG of rows of samples, each reduced pass filtered by every filter type in turn.
+    """
+    planes = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    fu, raw = max(1, planes * bitdepth // 8), bytearray()
+    passes = [p for p in aesthetic.ADAM7 if p[0] < width and p[1] < height] if interlace else [(0, 0, 1, 1)]
+    for xs, ys, dx, dy in passes:
+        previous = None
+        for y in range(ys, height, dy):
+            values = [v for x in range(xs, width, dx) for v in samples[y][x * planes:(x + 1) * planes]]
+            if bitdepth == 16:
+                line = b"".join(v.to_bytes(2, "big") for v in values)
+            else:
+                per = 8 // bitdepth
+                values += [0] * (-len(values) % per)
+                line = bytes(sum(v << bitdepth * (per - 1 - i) for i, v in enumerate(values[k:k + per]))
+                             for k in range(0, len(values), per))
+            previous, flt = previous or bytes(len(line)), y % 5
+            out = bytearray()
+            for i, v in enumerate(line):
+                a, b, c = line[i - fu] if i >= fu else 0, previous[i], previous[i - fu] if i >= fu else 0
+                p = a + b - c
+                paeth = a if abs(p - a) <= abs(p - b) and abs(p - a) <= abs(p - c) else b if abs(p - b) <= abs(p - c) \
+                    else c
+                out.append((v - (0, a, b, (a + b) // 2, paeth)[flt]) & 0xff)
+            raw += bytes([flt]) + out
+            previous = line
+    header = chunk(b"IHDR", pack(">2I5B", width, height, bitdepth, color_type, 0, 0, interlace))
+    plte = chunk(b"PLTE", bytes(k & 0xff for k in range(3 << bitdepth))) if color_type == 3 else b""
+    return b"\x89PNG\r\n\x1a\n" + header + plte + chunk(b"IDAT", compress(bytes(raw))) + chunk(b"IEND", b"")
+
+
+@pytest.mark.parametrize("color_type,bitdepth", [(0, 1), (0, 2), (0, 4), (0, 8), (0, 16), (2, 8), (2, 16), (3, 1),
+                                                 (3, 2), (3, 4), (3, 8), (4, 8), (4, 16), (6, 8), (6, 16)])
+@pytest.mark.parametrize("interlace", [0, 1])
+@pytest.mark.parametrize("width,height", [(1, 1), (3, 2), (8, 8), (9, 7), (17, 3), (33, 33)])
+def test_read_round_trip(color_type, bitdepth, interlace, width, height):
+    planes = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    top = (1 << bitdepth) - 1
+    samples = [[(x * 31 + y * 17 + p * 7 + x * y) * 2654435761 % (top + 1) for x in range(width) for p in range(planes)]
+               for y in range(height)]
+    w, h, rows, info = aesthetic.ReaderPNG(encode(width, height, color_type, bitdepth, interlace, samples)).read()
+    assert (w, h, info["bitdepth"], info["interlace"]) == (width, height, bitdepth, interlace)
+    assert [list(row) for row in rows] == samples
+
+
+
+@pytest.mark.parametrize("filter_type", [-1, 5, 7, "1", 1.5])
+def test_writer_filter_type(filter_type):
+    with pytest.raises(Exception, match="Invalid PNG filter type"):
+        aesthetic.make_png(35, seed=1, filter_type=filter_type)
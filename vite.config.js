@@ -71,7 +71,7 @@ export default defineConfig({
       registerType: "autoUpdate",
       workbox: {
         maximumFileSizeToCacheInBytes: 9e6,
-        globPatterns: ["**/*.{bz2,css,data,html,ico,js,json,manifest,map,mjs,ogg,py,scss,tar,wasm,webmanifest,whl,zip}"],
+        globPatterns: ["**/*.{bin,bz2,css,data,html,ico,js,json,manifest,map,mjs,ogg,py,scss,tar,wasm,webmanifest,whl,zip}"],
       },
       devOptions: {
         enabled: false,